@@ -68,19 +68,42 @@ class Action(Enum):
         self.box_row_delta = brd # horisontal displacement box (-1,0,+1)
         self.box_col_delta = bcd # vertical displacement box (-1,0,+1)
 
+def _get_direction(from_loc: tuple[int, int], to_loc: tuple[int, int]) -> tuple[int, int]:
+    # unit step from from_loc towards to_loc, along the columns when both are on the same row
+    if from_loc[0] == to_loc[0]:
+        return (0, -1) if from_loc[1] > to_loc[1] else (0, 1)
+    return (-1, 0) if from_loc[0] > to_loc[0] else (1, 0)
+
+# Lookup tables built once from the action deltas, used by the location helpers below
+# direction -> move action in that direction
+MOVE_BY_DIRECTION = {
+    (action.agent_row_delta, action.agent_col_delta): action
+    for action in Action if action.type is ActionType.Move
+}
+# action -> (row, col) offset of the box after the action relative to the agent after the action
+BOX_RESULT_DELTA = {
+    action: (action.box_row_delta, action.box_col_delta) if action.type is ActionType.Push
+        else (-action.agent_row_delta, -action.agent_col_delta)
+    for action in Action if action.type is ActionType.Push or action.type is ActionType.Pull
+}
+# box direction -> (action when the agent is behind the box, action otherwise)
+PULL_BY_BOX_DIRECTION = {
+    (0, -1): (Action.PullWW, Action.PullSW),
+    (0, 1): (Action.PullEE, Action.PullSE),
+    (-1, 0): (Action.PullNN, Action.PullNW),
+    (1, 0): (Action.PullSS, Action.PullSW),
+}
+PUSH_BY_BOX_DIRECTION = {
+    (0, -1): (Action.PushWW, Action.PushSW),
+    (0, 1): (Action.PushEE, Action.PushSE),
+    (-1, 0): (Action.PushNN, Action.PushNW),
+    (1, 0): (Action.PushSS, Action.PushSW),
+}
+
 def get_move_from_loc(from_loc: tuple[int, int], to_loc: tuple[int, int]) -> Action:
     if from_loc == to_loc:
         return Action.NoOp
-    elif from_loc[0] == to_loc[0]:
-        if from_loc[1] > to_loc[1]:
-            return Action.MoveW
-        else:
-            return Action.MoveE
-    else:
-        if from_loc[0] > to_loc[0]:
-            return Action.MoveN
-        else:
-            return Action.MoveS
+    return MOVE_BY_DIRECTION[_get_direction(from_loc, to_loc)]
 
 def get_pull_from_loc(from_loc: tuple[int, int], to_loc: tuple[int, int], prev: Action) -> Action:
     if 'M' in str(prev):
@@ -124,54 +147,20 @@ def get_pull_from_loc(from_loc: tuple[int, int], to_loc: tuple[int, int], prev:
                 return Action.PullSW
 
 
+def _get_box_action(table: dict, box_from_loc: tuple[int, int], box_to_loc: tuple[int, int], agent_loc: tuple[int, int]) -> Action:
+    direction = _get_direction(box_from_loc, box_to_loc)
+    behind, other = table[direction]
+    # the agent is behind the box when it lies on the opposite side of the box's direction
+    offset = (agent_loc[0] - box_from_loc[0]) * direction[0] + (agent_loc[1] - box_from_loc[1]) * direction[1]
+    return behind if offset < 0 else other
+
+
 def get_pull_from_box_loc(box_from_loc: tuple[int, int], box_to_loc: tuple[int, int], agent_loc: tuple[int, int]) -> Action:
-    if box_from_loc[0] == box_to_loc[0]:
-        if box_from_loc[1] > box_to_loc[1]:
-            if agent_loc[1] > box_from_loc[1]:
-                return Action.PullWW
-            else:
-                return Action.PullSW
-        else:
-            if agent_loc[1] < box_from_loc[1]:
-                return Action.PullEE
-            else:
-                return Action.PullSE
-    else:
-        if box_from_loc[0] > box_to_loc[0]:
-            if agent_loc[0] > box_from_loc[0]:
-                return Action.PullNN
-            else:
-                return Action.PullNW
-        else:
-            if agent_loc[0] < box_from_loc[0]:
-                return Action.PullSS
-            else:
-                return Action.PullSW
+    return _get_box_action(PULL_BY_BOX_DIRECTION, box_from_loc, box_to_loc, agent_loc)
 
 
 def get_push_from_box_loc(box_from_loc: tuple[int, int], box_to_loc: tuple[int, int], agent_loc: tuple[int, int]) -> Action:
-    if box_from_loc[0] == box_to_loc[0]:
-        if box_from_loc[1] > box_to_loc[1]:
-            if agent_loc[1] > box_from_loc[1]:
-                return Action.PushWW
-            else:
-                return Action.PushSW
-        else:
-            if agent_loc[1] < box_from_loc[1]:
-                return Action.PushEE
-            else:
-                return Action.PushSE
-    else:
-        if box_from_loc[0] > box_to_loc[0]:
-            if agent_loc[0] > box_from_loc[0]:
-                return Action.PushNN
-            else:
-                return Action.PushNW
-        else:
-            if agent_loc[0] < box_from_loc[0]:
-                return Action.PushSS
-            else:
-                return Action.PushSW
+    return _get_box_action(PUSH_BY_BOX_DIRECTION, box_from_loc, box_to_loc, agent_loc)
 
 def get_push_from_loc(from_loc: tuple[int, int], to_loc: tuple[int, int], prev: Action) -> Action:
     if 'M' in str(prev):
@@ -254,19 +243,24 @@ def get_pull_from_push(action: Action) -> Action:
     else:
         return Action.NoOp
 
-def get_box_result_location(action: Action, loc: tuple[int, int]) -> tuple[int, int]:
-    if (action == Action.PushSS or action == Action.PushES or action == Action.PushWS or
-        action == Action.PullNW or action == Action.PullNN or action == Action.PullNE):
-        return (loc[0] + 1, loc[1])
-
-    elif (action == Action.PushSE or action == Action.PushEE or action == Action.PushNE or
-        action == Action.PullWS or action == Action.PullWW or action == Action.PullWN):
-        return (loc[0], loc[1] + 1)
+# pull -> the push it undoes, see get_pull_from_push
+PUSH_FROM_PULL = {get_pull_from_push(action): action for action in Action if action.type is ActionType.Push}
 
-    elif (action == Action.PushSW or action == Action.PushWW or action == Action.PushNW or
-        action == Action.PullES or action == Action.PullEE or action == Action.PullEN):
-        return (loc[0], loc[1] - 1)
+def get_reverse_action(action: Action) -> Action:
+    """
+        The action that undoes action, a move is undone by the opposite move, a push by a pull
+        and a pull by a push
+    """
+    if action.type is ActionType.Move:
+        return get_opposite_move_action(action)
+    if action.type is ActionType.Push:
+        return get_pull_from_push(action)
+    if action.type is ActionType.Pull:
+        return PUSH_FROM_PULL[action]
+    return Action.NoOp
 
-    elif (action == Action.PushEN or action == Action.PushWN or action == Action.PushNN or
-        action == Action.PullSS or action == Action.PullSE or action == Action.PullSW):
-        return (loc[0] - 1, loc[1])
\ No newline at end of file
+def get_box_result_location(action: Action, loc: tuple[int, int]) -> tuple[int, int]:
+    delta = BOX_RESULT_DELTA.get(action)
+    if delta is None:
+        return None
+    return (loc[0] + delta[0], loc[1] + delta[1])
@@ -1,34 +1,47 @@
 from action import *
-from state import State
+from state import State, PartialState
+from config import Config
+from level import Level
 from heuristic import HeuristicAStar
 from entities import Box, Goal
 from substate import find_best_match
 from frontier import FrontierBestFirst
 from substate import get_reduced_state
+from nodestore import NodeStore
+import external
 import sys
+import itertools
+from heapq import heapify, heappop, heappush
+from math import inf
 import memory
 import time
+import gc
 globals().update(Action.__members__)
 start_time = time.perf_counter()
 goal_counter = 0
+# Frontier states bounded_subsearch keeps when subsearch runs out of memory, the number of
+# states the transposition table of its IDA* search holds, and the seconds it may search.
+memory_slice = 16
+transposition_limit = 1000000
+ida_time_limit = 60.0
+# Move actions by (row delta, col delta), used to fill in walks, see get_walk
+MOVES = {(action.agent_row_delta, action.agent_col_delta): action for action in Action if action.type is ActionType.Move}
 
-def noop(target: str, plans: dict, locations: dict, noop_count: int, start: int) -> dict:
+def noop(target: str, plans: dict, locations: dict, noop_count: int, start: int, level: Level) -> dict:
     """
         Add noop actions to the beginning of the plan of the target agent
     """
     print(f"Agent {target} will noop", file=sys.stderr, flush=True)
     plans[target] = [[Action.NoOp]] * noop_count + plans[target]
-    if start != 0:
-        locations[target] = [locations[target][0]] * noop_count + locations[target] 
-    else: 
-        locations[target] = [State.initial_agents_locs[target]] * noop_count + locations[target]
+    # the agent waits where it starts, whatever step the conflict is at
+    locations[target] = [level.initial_agents_locs[target]] * noop_count + locations[target]
     return plans, locations
 
 
-def sidestep(target: str, index: int, plans: dict, locations: dict, neighbors: list, ghost: bool) -> dict:
+def sidestep(target: str, index: int, plans: dict, locations: dict, neighbors: list, ghost: bool, level: Level) -> dict:
     print(f"Agent {target} will sidestep with neighbors {neighbors}", file=sys.stderr, flush=True)
     if ghost: index -= 1
-    from_loc = locations[target][index-1]
+    from_loc = locations[target][index-1] if index > 0 else level.initial_agents_locs[target]
     to_loc = neighbors[0]
     noop_count = 2 if not ghost else 3
     # understand direction
@@ -40,44 +53,55 @@ def sidestep(target: str, index: int, plans: dict, locations: dict, neighbors: l
     return plans, locations
 
 
-def backtrack_with_boxes(target: str, leader: str, index: int, plans: dict, locations: dict, ghost: bool) -> dict:
+def backtrack_with_boxes(target: str, leader: str, index: int, plans: dict, locations: dict, ghost: bool, level: Level) -> dict:
     print(f"Agent {target} will backtrack with boxes", file=sys.stderr, flush=True)
     backtrack_actions = []
     backtrack_locations = []
-    noop_count = 2
+    noop_count = 1
     
     up = index
     down = index
     
     box_loc = get_box_result_location(plans[target][down][0], locations[target][down])
     last_action = plans[target][down][0] if down > 0 else None
-    while (locations[leader][up] == box_loc and down >= 0):
+    # the leader stays at its last location once its plan is done
+    last = len(locations[leader]) - 1
+    while down > 0 and locations[leader][min(up, last)] == box_loc: # there is nothing to undo before the first action
         up += 1
         down -= 1
-        opposite_action = get_pull_from_push(plans[target][down][0])
+        opposite_action = get_reverse_action(plans[target][down][0])
         last_action = opposite_action if opposite_action != Action.NoOp else last_action
         backtrack_actions.append([opposite_action])
-        box_loc = get_box_result_location(plans[target][down][0], locations[target][down])
+        # with the action undone the box is back where the one before left it
+        box_loc = get_box_result_location(plans[target][down-1][0], locations[target][down-1]) if down > 0 else None
         if down == 0:
-            noop_count += 1
-            backtrack_locations.append(State.initial_agents_locs[target])
+            backtrack_locations.append(level.initial_agents_locs[target])
         else:
             backtrack_locations.append(locations[target][down-1])
     
-    if down < 0:
+    if not backtrack_locations: # the box is not on the leader's path, the target only waits where it is
+        backtrack_actions.append([Action.NoOp])
+        backtrack_locations.append(locations[target][down-1] if down > 0 else level.initial_agents_locs[target])
+        noop_count = 0
+    elif plans[target][down][0] is Action.NoOp: # the undone actions are done again, but a wait is not waited again
         down += 1
-    else:
-        noop_count = 1
+    # it goes on once the leader is off the cell the box is moved into next and not leaving it
+    cell = get_box_result_location(plans[target][down][0], locations[target][down]) if down < len(plans[target]) else None
+    while cell is not None:
+        step = index + len(backtrack_actions) + noop_count
+        if step - 1 > last or cell not in (locations[leader][min(step, last)], locations[leader][step - 1]):
+            break
+        noop_count += 1
     backtrack_actions += [[Action.NoOp]] * noop_count
     backtrack_locations += [backtrack_locations[-1]] * noop_count
 
-    plans[target] = plans[target][:index] + backtrack_actions + plans[target][down+1:]
-    locations[target] = locations[target][:index] + backtrack_locations + locations[target][down+1:]
+    plans[target] = plans[target][:index] + backtrack_actions + plans[target][down:]
+    locations[target] = locations[target][:index] + backtrack_locations + locations[target][down:]
 
     return plans, locations
 
 
-def backtrack(target: str, leader: str, index: int, plans: dict, locations: dict, ghost: bool) -> dict:
+def backtrack(target: str, leader: str, index: int, plans: dict, locations: dict, ghost: bool, level: Level) -> dict:
     print(f"Agent {target} will backtrack", file=sys.stderr, flush=True)
     backtrack_actions = []
     backtrack_locations = []
@@ -87,15 +111,17 @@ def backtrack(target: str, leader: str, index: int, plans: dict, locations: dict
     if ghost:
         down -= 1
     last_action = plans[target][down][0] if down > 0 else None
-    while (locations[leader][up] == locations[target][down] and down >= 0):
+    # the leader stays at its last location once its plan is done
+    last = len(locations[leader]) - 1
+    while down > 0 and locations[leader][min(up, last)] == locations[target][down]: # there is nothing to undo before the first action
         up += 1
         down -= 1
-        opposite_action = get_opposite_move_action(plans[target][down][0])
+        opposite_action = get_reverse_action(plans[target][down][0])
         last_action = opposite_action if opposite_action != Action.NoOp else last_action
-        backtrack_actions.append([get_opposite_move_action(plans[target][down][0])])
+        backtrack_actions.append([opposite_action])
         if down <= 0:
             noop_count += 1
-            backtrack_locations.append(State.initial_agents_locs[target])
+            backtrack_locations.append(level.initial_agents_locs[target])
         else:
             backtrack_locations.append(locations[target][down-1])
     
@@ -103,6 +129,19 @@ def backtrack(target: str, leader: str, index: int, plans: dict, locations: dict
         down += 1
     else:
         noop_count = 1
+    if not backtrack_locations: # target is not on the leader's path, it only waits where it is
+        backtrack_actions.append([Action.NoOp])
+        backtrack_locations.append(locations[target][down-1] if down > 0 else level.initial_agents_locs[target])
+        noop_count -= 1
+    # it goes on once the leader is off the cell it enters next and not leaving it, as an agent
+    # cannot follow another one
+    start = index - 1 if ghost else index
+    cell = locations[target][down]
+    while True:
+        step = start + len(backtrack_actions) + noop_count
+        if step - 1 > last or cell not in (locations[leader][min(step, last)], locations[leader][step - 1]):
+            break
+        noop_count += 1
     backtrack_actions += [[Action.NoOp]] * noop_count
     backtrack_locations += [backtrack_locations[-1]] * noop_count
 
@@ -133,7 +172,7 @@ def get_deadlock_valid_locations(state: State, agent_loc: tuple[int, int], box_l
     return valid_locations
 
 
-def solve_deadlock(state: State, plans: dict, locations: dict, box: Box, locked_agent: str, locked_plan: list[Action], locked_locations: list[tuple[int, int]], index: int) -> dict:
+def solve_deadlock(state: State, plans: dict, locations: dict, box: Box, locked_agent: str, locked_plan: list[Action], locked_locations: list[tuple[int, int]], index: int, config: Config) -> dict:
     solver_agent = find_best_match(state, box, plans)
     print(f"Agent {solver_agent.type} will solve deadlock", file=sys.stderr, flush=True)
 
@@ -141,11 +180,11 @@ def solve_deadlock(state: State, plans: dict, locations: dict, box: Box, locked_
     reduced_state = get_reduced_state(state, {"agent": solver_agent, "goal": subgoal}, state.g)
     frontier = FrontierBestFirst(HeuristicAStar(reduced_state))
     
-    solving_plan, solving_locations = subsearch(reduced_state, frontier)
+    solving_plan, solving_locations = subsearch(reduced_state, frontier, config)
     if len(solving_plan) < 2: # agent is already at box
         solving_plan = []
         solving_locations = []
-        # solver_agent_loc = State.initial_agents_locs[solver_agent.type]
+        # solver_agent_loc = state.level.initial_agents_locs[solver_agent.type]
         solver_agent_loc = (solver_agent.row, solver_agent.col)
         t = 0
         box_loc = (box.row, box.col)
@@ -198,10 +237,10 @@ def solve_deadlock(state: State, plans: dict, locations: dict, box: Box, locked_
 
     if locked_agent in plans.keys():
         plans[locked_agent] = [[Action.NoOp]] * len(solving_plan) + locked_plan + plans[locked_agent]
-        locations[locked_agent] = [State.initial_agents_locs[locked_agent]] * len(solving_plan) + locked_locations + locations[locked_agent]
+        locations[locked_agent] = [state.level.initial_agents_locs[locked_agent]] * len(solving_plan) + locked_locations + locations[locked_agent]
     else:
         plans[locked_agent] = [[Action.NoOp]] * len(solving_plan) + locked_plan
-        locations[locked_agent] = [State.initial_agents_locs[locked_agent]] * len(solving_plan) + locked_locations
+        locations[locked_agent] = [state.level.initial_agents_locs[locked_agent]] * len(solving_plan) + locked_locations
     if solver_agent.type in plans.keys():
         plans[solver_agent.type] += full_solving_plan
         locations[solver_agent.type] += full_solving_locations
@@ -218,38 +257,584 @@ def solve_deadlock(state: State, plans: dict, locations: dict, box: Box, locked_
     return plans, locations, state
 
 
-def subsearch(initial_state: State, frontier) -> State:
+def subsearch(initial_state: State, frontier, config: Config, weights: list = None, time_limit: float = None) -> State:
+    """
+        Plan for a reduced state, with frontier as search strategy. Agent goals of a single agent
+        are first searched with bidirectional_subsearch. With weights set, the subproblem is
+        searched with ARA* instead, using the heuristic of frontier, and with config.external
+        with external A* on disk, see external.external_subsearch.
+        A state found again by a cheaper path replaces its entry in the frontier, or when it
+        was already expanded goes back into the frontier if config.reopen_closed is set.
+    """
+    if initial_state.agents_only and initial_state.num_agents == 1 and not initial_state.reservations.blocked_at:
+        solution = bidirectional_subsearch(initial_state)
+        if solution is not None:
+            return solution
+        # reserved cells and left out boxes are avoided for good there, try again in time
+    if weights is not None:
+        return anytime_subsearch(initial_state, frontier.heuristic, config, weights, time_limit)
+    if config.external and external.np is not None:
+        heuristic = getattr(frontier, 'heuristic', None) or HeuristicAStar(initial_state)
+        return external.external_subsearch(initial_state, heuristic, config, bounded_subsearch)
+    if config.push_level and not initial_state.agents_only and initial_state.num_agents == 1 and not initial_state.reservations.blocked_at:
+        solution = push_subsearch(initial_state, frontier, config)
+        if solution is not None:
+            return solution
+        # cells reserved from some time step on are avoided for good there, try again move by move
+        frontier.clear()
     iterations = 0
-    # count how many agents are at their destination
     frontier.add(initial_state)
-    explored = set()
+    nodes = NodeStore(initial_state)
+    best_g = {initial_state.__hash__(): initial_state.g}
+    expanded = set()
     
     while True:
         iterations += 1
         if iterations % 1000  == 0:
-            print_search_status(explored, frontier)
+            print_search_status(expanded, frontier, config)
 
-        if memory.get_usage() > memory.max_usage:
-            print_search_status(explored, frontier)
-            print('Maximum memory usage exceeded.', file=sys.stderr, flush=True)
-            return None
+        if memory.get_usage() > config.max_memory:
+            print_search_status(expanded, frontier, config)
+            print('Maximum memory usage exceeded, continuing with IDA* from the best frontier states.', file=sys.stderr, flush=True)
+            heuristic = getattr(frontier, 'heuristic', None) or HeuristicAStar(initial_state)
+            states = get_memory_slice(frontier, nodes)
+            # everything but the slice and the plans to it is dropped before IDA* starts
+            best_g = expanded = nodes = current_state = children = None
+            gc.collect()
+            return bounded_subsearch(states, heuristic, config)
         
         if frontier.is_empty():
             return None
 
         # choose new state, and remove it from frontier
-        current_state = frontier.pop()
+        current_state = frontier.pop().materialize()
+        fingerprint = current_state.__hash__()
+        if fingerprint in expanded:
+            continue
+        expanded.add(fingerprint)
+        nodes.add(current_state)
         if (current_state.is_subgoal_state()):
-            print_search_status(explored, frontier)
+            print_search_status(expanded, frontier, config)
             return current_state.extract_plan_with_locations()
         
-        for child in current_state.get_expanded_states():
-            if (not frontier.contains(child) and (child not in explored)):
-                explored.add(child) # this wasnt used, weird
-                frontier.add(child)
+        children = current_state.get_expanded_states(lazy=config.lazy_expansion)
+        add_children(frontier, children, best_g, expanded, config.reopen_closed)
+
+
+def add_children(frontier, children: list, best_g: dict, expanded: set = None, reopen: bool = False):
+    """
+        Adds to frontier the children that were not generated before with a g as low as theirs,
+        and records their g in best_g. A child in expanded was reached more cheaply after it was
+        expanded, it is taken out of expanded and added again only if reopen is set. A child the
+        frontier holds with a higher g replaces its entry there (decrease-key).
+        best_g and expanded only hold state fingerprints, the expanded states themselves are
+        kept by the caller in a NodeStore.
+    """
+    for child in children:
+        fingerprint = child.__hash__()
+        g = best_g.get(fingerprint)
+        if g is not None and g <= child.g:
+            continue
+        if expanded is not None and fingerprint in expanded:
+            if not reopen:
+                continue
+            expanded.remove(fingerprint)
+        best_g[fingerprint] = child.g
+        frontier.add(child)
+
+
+def bidirectional_subsearch(initial_state: State):
+    """
+        Bidirectional A* for a reduced state where agent 0 only has to reach its goal cell. A
+        forward search from the agent and a backward search from the goal cell are each guided
+        by the true distance to the other end (front-to-end), and the side with the lower f on
+        top of its open list is expanded. The searches stop once neither open list can hold a
+        shorter path than the best one through a cell both have reached. Cells reserved from
+        some time step on are avoided at all times, so None is returned when every path needs
+        one of them, as when there is no path at all. The boxes left out of the reduced state
+        (State.obstacles) are walked around as well, nothing would move them out of the way.
+        None is also returned when walking around them is longer than the distance through the
+        level, the search in time may still find that one. The plan and locations are those
+        State.extract_plan_with_locations gives for the same path.
+    """
+    level = initial_state.level
+    agent = initial_state.agents_map['0']
+    goal = next(iter(initial_state.goals_map.values()))
+    start = level.cell_ids[agent.row][agent.col]
+    end = level.cell_ids[goal.row][goal.col]
+    if start == end:
+        return [], []
+    # distances to the other end guide each side
+    heuristics = (level.get_cell_distances(end), level.get_cell_distances(start))
+    if heuristics[0][start] == inf:
+        return None
+    g = ({start: 0}, {end: 0})
+    parents = ({start: None}, {end: None})
+    # (f, -g, cell), so the deepest of the cells with the lowest f is expanded first
+    open_lists = ([(heuristics[0][start], 0, start)], [(heuristics[1][end], 0, end)])
+    closed = (set(), set())
+    best = inf
+    meeting_cell = None
+    expanded = 0
+
+    while open_lists[0] and open_lists[1]:
+        if max(open_lists[0][0][0], open_lists[1][0][0]) >= best:
+            break
+        side = 0 if open_lists[0][0][0] <= open_lists[1][0][0] else 1
+        f, depth, cell = heappop(open_lists[side])
+        if cell in closed[side]:
+            continue
+        closed[side].add(cell)
+        expanded += 1
+        cell_g = -depth
+        for neighbor in level.neighbors[cell]:
+            if not is_walkable(initial_state, neighbor) or level.cells[neighbor] in initial_state.obstacles:
+                continue
+            neighbor_g = cell_g + 1
+            if neighbor_g < g[side].get(neighbor, inf):
+                g[side][neighbor] = neighbor_g
+                parents[side][neighbor] = cell
+                heappush(open_lists[side], (neighbor_g + heuristics[side][neighbor], -neighbor_g, neighbor))
+                other_g = g[1 - side].get(neighbor)
+                if other_g is not None and neighbor_g + other_g < best:
+                    best = neighbor_g + other_g
+                    meeting_cell = neighbor
+
+    print(f'Bidirectional search: expanded {expanded:,} cells', file=sys.stderr, flush=True)
+    if meeting_cell is None or best > heuristics[0][start]:
+        return None
+    path = []
+    cell = meeting_cell
+    while cell is not None:
+        path.append(cell)
+        cell = parents[0][cell]
+    path.reverse()
+    cell = parents[1][meeting_cell]
+    while cell is not None:
+        path.append(cell)
+        cell = parents[1][cell]
+
+    plan = []
+    locations = []
+    for previous, cell in zip(path, path[1:]):
+        (row, col), (previous_row, previous_col) = level.cells[cell], level.cells[previous]
+        plan.append([MOVES[(row - previous_row, col - previous_col)]])
+        locations.append((row, col))
+    return plan, locations
+
+
+def get_memory_slice(frontier, nodes: NodeStore) -> list:
+    """
+        The memory_slice best states of frontier, each with the plan and locations leading to
+        it from nodes. The rest of the frontier is dropped and the states are detached from
+        nodes, so nothing keeps the expanded nodes alive once subsearch lets go of them.
+    """
+    states = []
+    while len(states) < memory_slice and not frontier.is_empty():
+        state = frontier.pop().materialize()
+        nodes.add(state)
+        plan, locations = state.extract_plan_with_locations()
+        # the state is the root of the IDA* plans now, see State.extract_plan_with_locations
+        state.nodes = None
+        state.joint_action = None
+        state.macro = None
+        states.append((state, plan, locations))
+    frontier.clear()
+    nodes.root.nodes = None
+    return states
+
+
+def bounded_subsearch(states: list, heuristic, config: Config) -> tuple:
+    """
+        Memory-bounded fallback of subsearch: an IDA* search is run from each of states in turn,
+        (state, plan to it, locations) as from get_memory_slice or external.external_subsearch,
+        until one finds a plan or ida_time_limit seconds are up.
+        Moves can be undone in this domain, so a plan from the initial state can be found from
+        any of them. The plan is the one to the slice state followed by the one found by IDA*.
+    """
+    deadline = time.perf_counter() + ida_time_limit
+    for state, plan, locations in states:
+        path = ida_search(state, heuristic, config, deadline)
+        if path is not None:
+            ida_plan, ida_locations = path[-1].extract_plan_with_locations()
+            return plan + ida_plan, locations + ida_locations
+        if time.perf_counter() > deadline:
+            print('IDA* time limit exceeded.', file=sys.stderr, flush=True)
+            break
+    return None
+
+
+def ida_search(initial_state: State, heuristic, config: Config, deadline: float = None) -> list[State]:
+    """
+        IDA*: depth-first searches bounded by f = g + h, the bound raised to the lowest f
+        beyond it after each one. Memory is the current path, plus a transposition table of
+        the lowest g each state was reached with in this iteration that holds at most
+        transposition_limit states, and no more once config.max_memory is reached. Returns the
+        path from initial_state to a subgoal state, or None if there is none or the deadline
+        passes first.
+    """
+    bound = initial_state.g + heuristic.h(initial_state)
+    iterations = 0
+    limit = transposition_limit
+    while bound < inf:
+        print(f'IDA* bound {bound}', file=sys.stderr, flush=True)
+        next_bound = inf
+        transpositions = {initial_state.__hash__(): initial_state.g}
+        path = [initial_state]
+        # children of each state on path left to search, best h last
+        children = [None]
+        while path:
+            iterations += 1
+            if iterations % 1000 == 0:
+                if deadline is not None and time.perf_counter() > deadline:
+                    return None
+                if len(transpositions) < limit and memory.get_usage() > config.max_memory:
+                    limit = len(transpositions)
+            state = path[-1]
+            if children[-1] is None:
+                f = state.g + heuristic.h(state)
+                if f > bound:
+                    next_bound = min(next_bound, f)
+                    path.pop()
+                    children.pop()
+                    continue
+                if state.is_subgoal_state():
+                    return path
+                expanded_states = state.get_expanded_states()
+                expanded_states.sort(key=heuristic.h, reverse=True)
+                children[-1] = expanded_states
+            if not children[-1]:
+                path.pop()
+                children.pop()
+                continue
+            child = children[-1].pop()
+            fingerprint = child.__hash__()
+            if transpositions.get(fingerprint, inf) <= child.g:
+                continue
+            if fingerprint in transpositions or len(transpositions) < limit:
+                transpositions[fingerprint] = child.g
+            path.append(child)
+            children.append(None)
+        bound = next_bound
+    return None
+
+
+def push_subsearch(initial_state: State, frontier, config: Config):
+    """
+        Push-level search for a reduced state with a single agent: states that only differ in
+        where the agent stands within the region it can walk in without moving a box are one
+        state, identified by the boxes and a canonical cell of the region (see get_push_key).
+        A state is expanded into every push and pull the agent can make from anywhere in its
+        region, the walks to the cells they are made from are filled in once a plan is found.
+        Cells reserved from some time step on are avoided at all times, so None is returned
+        for some subproblems subsearch can solve.
+        As in subsearch, a state found again by a cheaper path replaces its entry in the
+        frontier, and when its push key was already expanded with a higher g it is only
+        expanded again if config.reopen_closed is set.
+    """
+    iterations = 0
+    frontier.add(initial_state)
+    # lowest g of the generated states by fingerprint, and of the expanded states by push key
+    best_g = {initial_state.__hash__(): initial_state.g}
+    expanded = {}
+
+    while True:
+        iterations += 1
+        if iterations % 1000 == 0:
+            print_search_status(expanded, frontier, config)
+
+        if memory.get_usage() > config.max_memory:
+            print_search_status(expanded, frontier, config)
+            print('Maximum memory usage exceeded.', file=sys.stderr, flush=True)
+            return None
+
+        if frontier.is_empty():
+            return None
+
+        current_state = frontier.pop()
+        if current_state.is_subgoal_state():
+            print_search_status(expanded, frontier, config)
+            return extract_push_plan(current_state)
+
+        # the region is only flooded once a state is popped, other agent cells of an expanded
+        # region are dropped here
+        reachable = get_reachable(current_state)
+        key = get_push_key(current_state, reachable)
+        g = expanded.get(key)
+        if g is not None and (g <= current_state.g or not config.reopen_closed):
+            continue
+        expanded[key] = current_state.g
+
+        # expanded states are checked by push key once they are popped, see above
+        add_children(frontier, get_push_states(current_state, reachable), best_g)
+
+
+def is_walkable(state: State, cell: int) -> bool:
+    # no box and not reserved at any time, the time a walk gets somewhere is not known in advance
+    row, col = state.level.cells[cell]
+    return state.boxes[row][col] == '' and (row, col) not in state.reservations.blocked_from
+
+
+def get_reachable(state: State) -> dict:
+    """
+        Cells next to a box agent 0 can move that it can walk to without moving a box, mapped
+        to the length of the walk. The flood fill stops once all of them are found.
+    """
+    level = state.level
+    agent = state.agents_map['0']
+    targets = set()
+    for box in state.boxes_map.values():
+        if box.color == agent.color:
+            targets.update(cell for cell in level.neighbors[level.cell_ids[box.row][box.col]] if is_walkable(state, cell))
+    start = level.cell_ids[agent.row][agent.col]
+    seen = {start}
+    reachable = {}
+    if start in targets:
+        reachable[start] = 0
+    layer = [start]
+    distance = 0
+    while layer and len(reachable) < len(targets):
+        distance += 1
+        next_layer = []
+        for cell in layer:
+            for neighbor in level.neighbors[cell]:
+                if neighbor not in seen and is_walkable(state, neighbor):
+                    seen.add(neighbor)
+                    next_layer.append(neighbor)
+                    if neighbor in targets:
+                        reachable[neighbor] = distance
+        layer = next_layer
+    return reachable
+
+
+def get_push_key(state: State, reachable: dict) -> tuple:
+    """
+        The Zobrist hash without the agent, and the canonical cell of the agent's region. The
+        region is known by the lowest cell next to a box it holds, since regions are disjoint,
+        so the flood fill does not have to cover it. Without such cells the agent's own cell
+        is used, the state has no children anyway.
+    """
+    agent = state.agents_map['0']
+    level = state.level
+    box_hash = state.__hash__() ^ level.zobrist['0'][agent.row][agent.col]
+    if reachable:
+        return box_hash, min(reachable)
+    return box_hash, level.cell_ids[agent.row][agent.col]
+
+
+def get_push_states(state: State, reachable: dict) -> list[State]:
+    """
+        Children of state for every push and pull agent 0 can make from a cell of reachable
+        (see get_reachable), with g counting the walk there. Dead children are left out.
+    """
+    level = state.level
+    agent = state.agents_map['0']
+    dead_cells = level.dead_cells
+    expanded_states = []
+    for cell, distance in reachable.items():
+        for action, agent_destination, box_location, box_destination in level.action_table[cell]:
+            if action.type is ActionType.Move:
+                continue
+            box_id = state.boxes[box_location[0]][box_location[1]]
+            if box_id == '':
+                continue
+            box = state.boxes_map[box_id]
+            if box.color != agent.color or box_destination in dead_cells.get(box.type, ()):
+                continue
+            destination = box_destination if action.type is ActionType.Push else agent_destination
+            if not is_walkable(state, level.cell_ids[destination[0]][destination[1]]):
+                continue
+            child = state.result([action], state.get_changes([action], origin=level.cells[cell]))
+            child.g = state.g + distance + 1
+            expanded_states.append(child)
+    return expanded_states
+
+
+def get_walk(state: State, target: tuple[int, int]) -> list[Action]:
+    """
+        Moves of a shortest walk of agent 0 to target, None if target is not in its region.
+    """
+    level = state.level
+    agent = state.agents_map['0']
+    start = level.cell_ids[agent.row][agent.col]
+    end = level.cell_ids[target[0]][target[1]]
+    previous = {start: None}
+    layer = [start]
+    while end not in previous:
+        if not layer:
+            return None
+        next_layer = []
+        for cell in layer:
+            for neighbor in level.neighbors[cell]:
+                if neighbor not in previous and is_walkable(state, neighbor):
+                    previous[neighbor] = cell
+                    next_layer.append(neighbor)
+        layer = next_layer
+    walk = []
+    cell = end
+    while previous[cell] is not None:
+        (row, col), (previous_row, previous_col) = level.cells[cell], level.cells[previous[cell]]
+        walk.append(MOVES[(row - previous_row, col - previous_col)])
+        cell = previous[cell]
+    walk.reverse()
+    return walk
+
+
+def extract_push_plan(state: State):
+    """
+        Plan and agent locations, as State.extract_plan_with_locations, of a state found by
+        push_subsearch: the walk to each push and pull is added in front of it. None if one
+        of the walks cannot be found.
+    """
+    segments = []
+    while state.parent is not None:
+        action = state.joint_action[0]
+        agent = state.agents_map['0']
+        origin = (agent.row - action.agent_row_delta, agent.col - action.agent_col_delta)
+        walk = get_walk(state.parent, origin)
+        if walk is None:
+            return None
+        segments.append(walk + [action])
+        state = state.parent
+    plan = []
+    locations = []
+    row, col = state.get_agent_location('0')
+    for segment in reversed(segments):
+        for action in segment:
+            row += action.agent_row_delta
+            col += action.agent_col_delta
+            plan.append([action])
+            locations.append((row, col))
+    return plan, locations
+
+
+def anytime_subsearch(initial_state: State, heuristic, config: Config, weights: list, time_limit: float = None):
+    """
+        Anytime repairing A* (ARA*): a first plan is found with f = g + w * h for the first
+        weight, then the search goes on with each lower weight, reusing the states found so far,
+        and returns the best plan once the last weight is done or time_limit seconds are up.
+        States reached more cheaply after they were expanded are kept aside (incons) and go
+        back into the open list when the weight is lowered.
+    """
+    deadline = time.perf_counter() + time_limit if time_limit is not None else None
+    nodes = NodeStore(initial_state)
+    counter = itertools.count()
+    best_g = {initial_state.__hash__(): initial_state.g}
+    closed = set()
+    incons = []
+    h = heuristic.h(initial_state)
+    open_list = [(weights[0] * h, next(counter), h, initial_state)]
+    solution = None
+    solution_cost = inf
+
+    for index, w in enumerate(weights):
+        while open_list and open_list[0][0] < solution_cost:
+            if memory.get_usage() > config.max_memory:
+                print('Maximum memory usage exceeded.', file=sys.stderr, flush=True)
+                return solution
+            if deadline is not None and solution is not None and time.perf_counter() > deadline:
+                print(f'ARA* out of time, keeping plan of length {solution_cost}', file=sys.stderr, flush=True)
+                return solution
+
+            _, _, _, state = heappop(open_list)
+            fingerprint = state.__hash__()
+            if fingerprint in closed or best_g.get(fingerprint, inf) < state.g:
+                continue # stale entry, a cheaper copy was pushed later
+            state = state.materialize()
+            nodes.add(state)
+            closed.add(fingerprint)
+            if state.is_subgoal_state():
+                solution = state.extract_plan_with_locations()
+                solution_cost = state.g
+                continue
+
+            for child in state.get_expanded_states(lazy=config.lazy_expansion):
+                fingerprint = child.__hash__()
+                if child.g >= best_g.get(fingerprint, inf):
+                    continue
+                best_g[fingerprint] = child.g
+                h = heuristic.h(child)
+                if fingerprint in closed:
+                    incons.append((h, child))
+                else:
+                    heappush(open_list, (child.g + w * h, next(counter), h, child))
+
+        if solution is None:
+            return None
+        print(f'ARA* weight {w}: plan of length {solution_cost}', file=sys.stderr, flush=True)
+        if index == len(weights) - 1 or (deadline is not None and time.perf_counter() > deadline):
+            break
+
+        # next weight: the open list and the states improved after expansion are searched again
+        w = weights[index + 1]
+        entries = [(h, state) for _, _, h, state in open_list] + incons
+        incons = []
+        closed = set()
+        open_list = []
+        for h, state in entries:
+            if best_g.get(state.__hash__(), inf) == state.g:
+                open_list.append((state.g + w * h, next(counter), h, state))
+        heapify(open_list)
+    return solution
+
+
+def fullsearch(initial_state: State, frontier, config: Config) -> list[list[Action]]:
+    """
+        Searches the whole level at once with operator decomposition, so multi-agent levels
+        expand one agent at a time instead of every joint action. Without a heuristic to
+        order them the intermediate states are expanded right away, so only full states go
+        into the frontier and breadth-first search still returns a shortest plan, but every
+        joint action is generated again. SearchClient only runs it with best-first strategies.
+    """
+    decompose = getattr(frontier, 'heuristic', None) is not None
+    iterations = 0
+    frontier.add(initial_state)
+    nodes = NodeStore(initial_state)
+    best_g = {initial_state.__hash__(): initial_state.g}
+    expanded = set()
+
+    while True:
+        iterations += 1
+        if iterations % 1000 == 0:
+            print_search_status(expanded, frontier, config)
+            # intermediate states are cheap, so memory is only checked every 1000 of them
+            if memory.get_usage() > config.max_memory:
+                print('Maximum memory usage exceeded.', file=sys.stderr, flush=True)
+                return None
+
+        if frontier.is_empty():
+            return None
+
+        current_state = frontier.pop().materialize()
+        fingerprint = current_state.__hash__()
+        if fingerprint in expanded:
+            continue
+        expanded.add(fingerprint)
+        if isinstance(current_state, State):
+            nodes.add(current_state)
+        if current_state.is_goal_state():
+            print_search_status(expanded, frontier, config)
+            return current_state.extract_plan()
+
+        children = current_state.get_expanded_states(lazy=config.lazy_expansion, decomposed=True)
+        if not decompose:
+            children = get_joint_states(children, config.lazy_expansion)
+        add_children(frontier, children, best_g, expanded, config.reopen_closed)
+
+
+def get_joint_states(states: list, lazy: bool = False) -> list:
+    # expands the intermediate states of operator decomposition down to full states
+    joint_states = []
+    while states:
+        state = states.pop()
+        if isinstance(state, PartialState):
+            states.extend(state.get_expanded_states(lazy=lazy))
+        else:
+            joint_states.append(state)
+    return joint_states
 
 
-def print_search_status(explored, frontier):
+def print_search_status(explored, frontier, config: Config):
     status_template = '#Expanded: {:8,}, #Frontier: {:8,}, #Generated: {:8,}, Time: {:3.3f} s\n[Alloc: {:4.2f} MB, MaxAlloc: {:4.2f} MB]'
     elapsed_time = time.perf_counter() - start_time
-    print(status_template.format(len(explored), frontier.size(), len(explored) + frontier.size(), elapsed_time, memory.get_usage(), memory.max_usage), file=sys.stderr, flush=True)
\ No newline at end of file
+    print(status_template.format(len(explored), frontier.size(), len(explored) + frontier.size(), elapsed_time, memory.get_usage(), config.max_memory), file=sys.stderr, flush=True)
\ No newline at end of file
@@ -0,0 +1,64 @@
+import copy
+from math import inf
+
+
+class Config:
+    """
+        Settings of one run, built from the program arguments by SearchClient.main. The level
+        keeps it as level.config, where states read how they are expanded, and the
+        searches get it passed in. Nothing is set on classes or modules, so levels searched with
+        different settings in one process do not change each other's.
+    """
+    __slots__ = (
+        'lazy_expansion',
+        'tunnel_macros',
+        'reserve_paths',
+        'push_level',
+        'reopen_closed',
+        'external',
+        'external_dir',
+        'h_cache',
+        'distance_cache',
+        'max_memory',
+    )
+
+    def __init__(
+        self,
+        lazy_expansion=False,
+        tunnel_macros=False,
+        reserve_paths=False,
+        push_level=False,
+        reopen_closed=False,
+        external=False,
+        external_dir=None,
+        h_cache=0,
+        distance_cache=None,
+        max_memory=inf,
+    ):
+        # Expand into StateHandles that are only built into States when popped from the frontier.
+        self.lazy_expansion = lazy_expansion
+        # Move a box pushed or pulled into a tunnel through it in one step, see State.follow_tunnel.
+        self.tunnel_macros = tunnel_macros
+        # Reserve the cells on each planned path so later subsearches avoid them.
+        self.reserve_paths = reserve_paths
+        # Search box subproblems over pushes and pulls, see algorithms.push_subsearch.
+        self.push_level = push_level
+        # Expand states again when they are reached more cheaply after they were expanded.
+        self.reopen_closed = reopen_closed
+        # Search subproblems with external.external_subsearch, in a temporary directory under
+        # external_dir (the system one if None).
+        self.external = external
+        self.external_dir = external_dir
+        # Number of h values HeuristicAStar keeps, least recently used first out, 0 to not cache them.
+        self.h_cache = h_cache
+        # Directory the distance tables are cached in, None to only build them in memory.
+        self.distance_cache = distance_cache
+        # Memory usage in MB (soft limit) from which searches fall back or give up.
+        self.max_memory = max_memory
+
+    def replace(self, **changes) -> 'Config':
+        ''' Copy of this config with the given settings changed. '''
+        config = copy.copy(self)
+        for name, value in changes.items():
+            setattr(config, name, value)
+        return config
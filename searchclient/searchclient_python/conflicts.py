@@ -1,6 +1,7 @@
 from action import get_box_result_location
 import sys
 from state import State
+from level import Level
 import copy
 from algorithms import noop, sidestep, backtrack, backtrack_with_boxes
 
@@ -29,30 +30,31 @@ def get_valid_locations(
 ) -> list[tuple[int, int]]:
     
     if ghost:
-        target_loc = target_locs[index-2] if index > 1 else State.initial_agents_locs[target]
-        prev_loc = target_locs[index-3] if index> 2 else State.initial_agents_locs[target]
+        target_loc = target_locs[index-2] if index > 1 else state.level.initial_agents_locs[target]
+        prev_loc = target_locs[index-3] if index> 2 else state.level.initial_agents_locs[target]
     else:
-        target_loc = target_locs[index-1] if index > 0 else State.initial_agents_locs[target]
-        prev_loc = target_locs[index-2] if index> 1 else State.initial_agents_locs[target]
+        target_loc = target_locs[index-1] if index > 0 else state.level.initial_agents_locs[target]
+        prev_loc = target_locs[index-2] if index> 1 else state.level.initial_agents_locs[target]
     conflict_loc = leader_locs[index]
     
     neighbors = []
     if target_loc[0] > 0:
         neighbors.append((target_loc[0] - 1, target_loc[1]))
-    if target_loc[0] < State.num_rows - 1:
+    if target_loc[0] < state.level.num_rows - 1:
         neighbors.append((target_loc[0] + 1, target_loc[1]))
     if target_loc[1] > 0:
         neighbors.append((target_loc[0], target_loc[1] - 1))
-    if target_loc[1] < State.num_cols - 1:
+    if target_loc[1] < state.level.num_cols - 1:
         neighbors.append((target_loc[0], target_loc[1] + 1))
 
+    leader_locs = set(leader_locs)
     valid_neighbors = []
     for loc in neighbors:
-        if  loc != conflict_loc and loc != prev_loc and state.is_free(loc[0], loc[1]) and loc not in leader_locs:
+        if  loc != conflict_loc and loc != prev_loc and state.is_free(loc[0], loc[1], index) and loc not in leader_locs:
             valid_neighbors.append(loc)
     return valid_neighbors
 
-def find_conflicts(plans: dict, locations: dict) -> dict:
+def find_conflicts(plans: dict, locations: dict, level: Level) -> dict:
     print("Looking for conflicts...", file=sys.stderr, flush=True)
     conflicts = {}
 
@@ -70,8 +72,8 @@ def find_conflicts(plans: dict, locations: dict) -> dict:
                                 if locs[i] == other_locs[i]: 
                                     conflict_type = "two_agents_same_location"
                                 else:
-                                    first_prev_loc = locs[i-1] if i > 0 else State.initial_agents_locs[first]
-                                    second_prev_loc = other_locs[i-1] if i > 0 else State.initial_agents_locs[second]
+                                    first_prev_loc = locs[i-1] if i > 0 else level.initial_agents_locs[first]
+                                    second_prev_loc = other_locs[i-1] if i > 0 else level.initial_agents_locs[second]
                                     if locs[i] == second_prev_loc or other_locs[i] == first_prev_loc:
                                         conflict_type = "agent_through_agent"
                             elif 'NoOp' in str(plans[second][i][0]): # 2nd agent is static
@@ -85,8 +87,8 @@ def find_conflicts(plans: dict, locations: dict) -> dict:
                         if 'M' not in str(plans[first][i][0]) or 'M' not in str(plans[second][i][0]): # push/pull conflict
                             first_box_loc = get_box_result_location(plans[first][i][0], locations[first][i]) if 'M' not in str(plans[first][i][0]) else None
                             second_box_loc = get_box_result_location(plans[second][i][0], locations[second][i]) if 'M' not in str(plans[second][i][0]) else None
-                            first_prev_loc = locs[i-1] if i > 0 else State.initial_agents_locs[first]
-                            second_prev_loc = other_locs[i-1] if i > 0 else State.initial_agents_locs[second]
+                            first_prev_loc = locs[i-1] if i > 0 else level.initial_agents_locs[first]
+                            second_prev_loc = other_locs[i-1] if i > 0 else level.initial_agents_locs[second]
                             
                             if first_box_loc and not second_box_loc:
                                 if first_box_loc == other_locs[i]:
@@ -108,6 +110,11 @@ def find_conflicts(plans: dict, locations: dict) -> dict:
                                     conflict_type = 'first_box_through_second_agent_prev'
                                 elif first_prev_loc == second_box_loc: 
                                     conflict_type = 'second_box_through_first_agent_prev'
+                            if not conflict_type: # an agent cannot follow another one into the cell it is leaving
+                                if locs[i] == second_prev_loc and locs[i] != first_prev_loc:
+                                    conflict_type = 'first_agent_through_second_agent_prev'
+                                elif other_locs[i] == first_prev_loc and other_locs[i] != second_prev_loc:
+                                    conflict_type = 'second_agent_through_first_agent_prev'
                         if conflict_type:
                             if first not in conflicts:
                                 conflicts[first] = {}
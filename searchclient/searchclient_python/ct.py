@@ -64,7 +64,7 @@ class CBS:
                     plans=new_plans1, 
                     locations=new_locations1, 
                     cost=node1_cost,
-                    conflicts=find_conflicts(new_plans1, new_locations1), 
+                    conflicts=find_conflicts(new_plans1, new_locations1, self.initial_state.level), 
                     parent=current_node
                 )
                 heapq.heappush(self.frontier, (node1.cost, node1)) # Push new node
@@ -87,7 +87,7 @@ class CBS:
                     plans=new_plans2, 
                     locations=new_locations2, 
                     cost=node2_cost, 
-                    conflicts=find_conflicts(new_plans2, new_locations2),
+                    conflicts=find_conflicts(new_plans2, new_locations2, self.initial_state.level),
                     parent=current_node
                 )
                 
@@ -55,10 +55,10 @@ class Node:
 
         ghost = True if conflict_type == "agent_through_agent" else False
         noop_count = 0
-        if conflict_type == "first_box_through_second_agent_prev":
+        if conflict_type in ("first_box_through_second_agent_prev", "first_agent_through_second_agent_prev"):
             noop_count = 1
             leader, target = target, leader
-        if conflict_type == "second_box_through_first_agent_prev": noop_count = 1
+        if conflict_type in ("second_box_through_first_agent_prev", "second_agent_through_first_agent_prev"): noop_count = 1
         elif conflict_type == "box_through_agent":
             noop_count = 2
             leader, target = target, leader
@@ -71,7 +71,8 @@ class Node:
                 plans=copy_plans,
                 locations=copy_locations,
                 noop_count=noop_count,
-                start=index
+                start=index,
+                level=self.state.level
             )
 
         else:
@@ -92,7 +93,8 @@ class Node:
                     plans=copy_plans,
                     locations=copy_locations,
                     neighbors=neighbors,
-                    ghost=ghost
+                    ghost=ghost,
+                    level=self.state.level,
                 )
             else:
                 if conflict_type == "agent_through_box":
@@ -103,6 +105,7 @@ class Node:
                         plans=copy_plans,
                         locations=copy_locations,
                         ghost=ghost,
+                        level=self.state.level,
                     )
                 else:  
                     return backtrack(
@@ -112,6 +115,7 @@ class Node:
                         plans=copy_plans,
                         locations=copy_locations,
                         ghost=ghost,
+                        level=self.state.level,
                     )
 
 
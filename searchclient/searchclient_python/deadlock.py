@@ -5,7 +5,8 @@ import sys
 from substate import get_reduced_state, find_best_match
 from algorithms import subsearch
 from frontier import FrontierBestFirst
-from heuristic import HeuristicAStar
+from heuristic import Heuristic, HeuristicAStar
+from config import Config
 
 def get_deadlock_valid_locations(state: State, agent_loc: tuple[int, int], box_loc: tuple[int, int], locked_locations: list[tuple[int, int]]) -> list[tuple[int, int]]:
     neighbors = [
@@ -24,19 +25,21 @@ def get_deadlock_valid_locations(state: State, agent_loc: tuple[int, int], box_l
     return valid_locations
 
 
-def solve_deadlock(state: State, plans: dict, locations: dict, box: Box, locked_agent: str, locked_plan: list[Action], locked_locations: list[tuple[int, int]], index: int) -> dict:
+def solve_deadlock(state: State, plans: dict, locations: dict, box: Box, locked_agent: str, locked_plan: list[Action], locked_locations: list[tuple[int, int]], index: int, config: Config, heuristic: Heuristic = None, weights: list = None, time_limit: float = None) -> dict:
     solver_agent = find_best_match(state, box, plans)
     print(f"Agent {solver_agent.type} will solve deadlock", file=sys.stderr, flush=True)
 
     subgoal = Goal(id=0, type=solver_agent.type, row=box.row, col=box.col)
     reduced_state = get_reduced_state(state, {"agent": solver_agent, "goal": subgoal}, state.g)
-    frontier = FrontierBestFirst(HeuristicAStar(reduced_state))
+    if heuristic is None:
+        heuristic = HeuristicAStar(reduced_state)
+    frontier = FrontierBestFirst(heuristic)
     
-    solving_plan, solving_locations = subsearch(reduced_state, frontier)
+    solving_plan, solving_locations = subsearch(reduced_state, frontier, config, weights, time_limit)
     if len(solving_plan) < 2: # agent is already at box
         solving_plan = []
         solving_locations = []
-        # solver_agent_loc = State.initial_agents_locs[solver_agent.type]
+        # solver_agent_loc = state.level.initial_agents_locs[solver_agent.type]
         solver_agent_loc = (solver_agent.row, solver_agent.col)
         t = 0
         box_loc = (box.row, box.col)
@@ -72,6 +75,10 @@ def solve_deadlock(state: State, plans: dict, locations: dict, box: Box, locked_
         box_loc = (box.row, box.col)
         t = 0
         while (box_loc == locked_locations[index]):
+            if t + 1 >= len(rev_solving_locations):
+                # the locked path runs back along the way the solver came, the box cannot be pulled off it
+                print(f"Agent {solver_agent.type} cannot pull box {box.type} off the path of agent {locked_agent}", file=sys.stderr, flush=True)
+                return None
             rev_solving_plan[t] = [get_opposite_move_action(rev_solving_plan[t][0])]
             rev_solving_plan[t] = [get_pull_from_loc(
                 rev_solving_locations[t],
@@ -81,6 +88,8 @@ def solve_deadlock(state: State, plans: dict, locations: dict, box: Box, locked_
             box_loc = rev_solving_locations[t]
             t += 1
             index += 1
+            if index >= len(locked_locations):
+                break
 
         rev_solving_plan = rev_solving_plan[:t]
         rev_solving_locations = rev_solving_locations[1:t+1]
@@ -90,10 +99,10 @@ def solve_deadlock(state: State, plans: dict, locations: dict, box: Box, locked_
 
     if locked_agent in plans.keys():
         plans[locked_agent] = plans[locked_agent] + [[Action.NoOp]] * len(solving_plan) + locked_plan
-        locations[locked_agent] = locations[locked_agent] + [State.initial_agents_locs[locked_agent]] * len(solving_plan) + locked_locations
+        locations[locked_agent] = locations[locked_agent] + [state.level.initial_agents_locs[locked_agent]] * len(solving_plan) + locked_locations
     else:
         plans[locked_agent] = [[Action.NoOp]] * len(solving_plan) + locked_plan
-        locations[locked_agent] = [State.initial_agents_locs[locked_agent]] * len(solving_plan) + locked_locations
+        locations[locked_agent] = [state.level.initial_agents_locs[locked_agent]] * len(solving_plan) + locked_locations
     if solver_agent.type in plans.keys():
         plans[solver_agent.type] += full_solving_plan
         locations[solver_agent.type] += full_solving_locations
@@ -107,6 +116,7 @@ def solve_deadlock(state: State, plans: dict, locations: dict, box: Box, locked_
     state.boxes_map[box.id].row = box_loc[0]
     state.boxes_map[box.id].col = box_loc[1]
     state.boxes[box_loc[0]][box_loc[1]] = box.id    
+    state.update_indexes()
 
     return plans, locations, state
 
@@ -0,0 +1,95 @@
+import hashlib
+import os
+import sys
+
+try:
+    import numpy as np
+except ImportError: # distances are then computed one BFS at a time by Level.get_distances
+    np = None
+
+UNREACHABLE = -1
+
+
+def get_distance_table(level: 'Level', cache_dir: 'str' = None) -> 'tuple':
+    '''
+    Distances from the goal cells and agent start cells of level to every cell, as an int16
+    array shaped (sources, cells) with UNREACHABLE for cells a source cannot reach (int32 on
+    levels too large for int16), and the dict from source cell id to its row. With cache_dir set, the table is stored as a .npy
+    file keyed by the walls and sources of the level and later runs memory-map it instead of
+    building it again. Returns (None, {}) when NumPy is not available.
+    '''
+    if np is None:
+        return None, {}
+    sources = get_sources(level)
+    rows = {source: row for row, source in enumerate(sources)}
+
+    path = None
+    if cache_dir is not None:
+        path = os.path.join(cache_dir, get_key(level, sources) + '.npy')
+        if os.path.exists(path):
+            return np.load(path, mmap_mode='r'), rows
+
+    table = build_distance_table(level.neighbors, len(level.cells), sources)
+    if path is not None:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # write to a temporary file first, another client may be reading the same table
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            cached = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=table.dtype, shape=table.shape)
+            cached[:] = table
+            cached.flush()
+            del cached
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f'Could not cache distance table: {e}', file=sys.stderr, flush=True)
+    return table, rows
+
+
+def get_sources(level: 'Level') -> 'list':
+    sources = []
+    for goal in level.goals_map.values():
+        sources.append(level.cell_ids[goal.row][goal.col])
+    for row, col in level.initial_agents_locs.values():
+        sources.append(level.cell_ids[row][col])
+    return sorted(set(sources))
+
+
+def get_key(level: 'Level', sources: 'list') -> 'str':
+    digest = hashlib.sha1()
+    digest.update(f'{level.num_rows}x{level.num_cols}'.encode())
+    for row in level.walls:
+        digest.update(bytes(row))
+    digest.update(repr(sources).encode())
+    return digest.hexdigest()
+
+
+def build_distance_table(neighbors: 'tuple', num_cells: 'int', sources: 'list') -> 'np.ndarray':
+    '''
+    Breadth-first search from all sources at once. The layer is kept as flat
+    (source row, cell id) index arrays, so every step expands the layers of all sources
+    with a handful of array operations.
+    '''
+    # neighbour ids per cell, padded with num_cells where a cell has less than four
+    padded = np.full((num_cells, 4), num_cells, dtype=np.int64)
+    for cell, ids in enumerate(neighbors):
+        padded[cell, :len(ids)] = ids
+
+    dtype = np.int16 if num_cells <= np.iinfo(np.int16).max else np.int32
+    table = np.full((len(sources), num_cells), UNREACHABLE, dtype=dtype)
+    layer_rows = np.arange(len(sources), dtype=np.int64)
+    layer_cells = np.array(sources, dtype=np.int64)
+    table[layer_rows, layer_cells] = 0
+
+    distance = 0
+    while layer_rows.size:
+        distance += 1
+        cells = padded[layer_cells].ravel()
+        rows = np.repeat(layer_rows, 4)
+        keep = cells != num_cells
+        rows, cells = rows[keep], cells[keep]
+        keep = table[rows, cells] == UNREACHABLE
+        rows, cells = rows[keep], cells[keep]
+        table[rows, cells] = distance
+        # a cell can be reached from several cells of the layer
+        layer_rows, layer_cells = np.divmod(np.unique(rows * num_cells + cells), num_cells)
+    return table
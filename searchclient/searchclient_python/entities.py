@@ -1,4 +1,6 @@
 class Agent:
+    __slots__ = ('type', 'color', 'row', 'col')
+
     def __init__(self, type, color, row, col):
         self.type = type
         self.color = color
@@ -11,6 +13,8 @@ class Agent:
         return (self.type, self.color, self.row, self.col) == (other.type, other.color, other.row, other.col)
 
 class Box:
+    __slots__ = ('id', 'color', 'row', 'col', 'type')
+
     def __init__(self, id, color, row, col, type):
         self.id = id
         self.color = color
@@ -24,6 +28,8 @@ class Box:
         return (self.color, self.row, self.col, self.type) == (other.color, other.row, other.col, other.type)
 
 class Goal:
+    __slots__ = ('id', 'type', 'row', 'col')
+
     def __init__(self, id, type, row, col):
         self.id = id
         self.type = type
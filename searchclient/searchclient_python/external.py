@@ -0,0 +1,262 @@
+import os
+import shutil
+import sys
+import tempfile
+from math import inf
+
+try:
+    import numpy as np
+except ImportError: # external search needs NumPy, subsearch keeps its frontier in memory without it
+    np = None
+
+from entities import Agent, Box
+from state import State
+import memory
+
+# Records expanded per chunk of a bucket, and generated records kept before they are written out.
+chunk_size = 10000
+buffer_size = 100000
+
+
+def external_subsearch(initial_state: 'State', heuristic: 'Heuristic', config: 'Config', fallback=None):
+    '''
+    External A* for a reduced state. States are kept on disk as NumPy records (see
+    get_record_dtype) in buckets by g and h, which are expanded by lowest f = g + h, then
+    lowest g. Children are written to run files of their bucket sorted by fingerprint but
+    unchecked, and duplicates are only removed once a bucket is about to be expanded (delayed
+    duplicate detection): its runs are merged chunk by chunk into one file sorted by
+    fingerprint, and the fingerprints of the expanded buckets with the same h are subtracted,
+    since a state always has the same h. Expanded buckets are kept as sorted, memory-mapped
+    files that serve as the closed list and to rebuild the plan. Only a chunk of each run
+    and the output buffers are in memory. The bucket files are put in a temporary directory
+    under config.external_dir.
+    If config.max_memory is still reached, fallback is called with the remaining states of the
+    bucket being expanded, heuristic and config, like algorithms.bounded_subsearch, and its
+    result is returned. Returns the plan and locations like State.extract_plan_with_locations, None if
+    there is none.
+    '''
+    directory = tempfile.mkdtemp(prefix='searchclient-', dir=config.external_dir)
+    try:
+        return ExternalSearch(initial_state, heuristic, config, directory, fallback).run()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def get_record_dtype(num_agents: 'int', num_boxes: 'int') -> 'np.dtype':
+    # fingerprint, fingerprint of the parent, joint action id and the cell ids of agents and boxes
+    return np.dtype([
+        ('fingerprint', np.uint64),
+        ('parent', np.uint64),
+        ('action', np.int32),
+        ('agents', np.int32, (num_agents,)),
+        ('boxes', np.int32, (num_boxes,)),
+    ])
+
+
+class ExternalSearch:
+    def __init__(self, initial_state: 'State', heuristic: 'Heuristic', config: 'Config', directory: 'str', fallback=None):
+        self.root = initial_state
+        self.heuristic = heuristic
+        self.config = config
+        self.directory = directory
+        self.fallback = fallback
+        self.level = initial_state.level
+        # rows of an empty box grid, shared by the rebuilt states until a box is put in them
+        self.empty_boxes = [['' for _ in range(self.level.num_cols)] for _ in range(self.level.num_rows)]
+        self.agent_names = sorted(initial_state.agents_map)
+        self.box_ids = list(initial_state.boxes_map)
+        self.dtype = get_record_dtype(len(self.agent_names), len(self.box_ids))
+        self.runs = {}  # (g, h) -> run files not expanded yet
+        self.buffers = {}  # (g, h) -> records not written yet
+        self.buffered = 0
+        self.expanded = {}  # h -> g -> sorted file of the expanded bucket
+        self.joint_actions = []  # joint action id -> list of the joint actions it stands for
+        self.joint_action_ids = {}  # tuple of tuples of actions -> joint action id
+        self.file_count = 0
+        self.expanded_count = 0
+
+    def run(self):
+        root = self.root
+        h = self.heuristic.h(root)
+        if h == inf:
+            return None
+        self.add(root.g, h, self.get_record(root, 0, -1))
+        while True:
+            self.flush()
+            if not self.runs:
+                return None
+            g, h = min(self.runs, key=lambda bucket: (bucket[0] + bucket[1], bucket[0]))
+            path, count = self.merge(g, h)
+            if count == 0:
+                continue
+            self.expanded.setdefault(h, {})[g] = path
+            records = self.load(path)
+            for start in range(0, count, chunk_size):
+                if memory.get_usage() > self.config.max_memory:
+                    if self.fallback is None:
+                        print('Maximum memory usage exceeded.', file=sys.stderr, flush=True)
+                        return None
+                    print('Maximum memory usage exceeded, continuing with IDA* from the bucket states.', file=sys.stderr, flush=True)
+                    self.buffers.clear()
+                    return self.fallback(self.get_slice(records, start, g), self.heuristic, self.config)
+                for record in np.array(records[start:start + chunk_size]):
+                    state = self.get_state(record, g)
+                    if state.is_subgoal_state():
+                        self.print_status(g, h)
+                        return self.extract_plan_with_locations(record, g)
+                    self.expand(state)
+                    self.expanded_count += 1
+            self.print_status(g, h)
+
+    def merge(self, g: 'int', h: 'int') -> 'tuple':
+        '''
+        Merges the sorted runs of bucket (g, h) into one sorted, duplicate-free file without the
+        states expanded before, and returns its path and number of records. The runs are read
+        a chunk at a time: every record up to the smallest last fingerprint of the chunks is in
+        the chunks, so those are merged and written out before reading on.
+        '''
+        paths = self.runs.pop((g, h))
+        runs = [self.load(path) for path in paths]
+        positions = [0] * len(runs)
+        closed = [self.load(closed_path)['fingerprint'] for closed_path in self.expanded.get(h, {}).values()]
+        path = os.path.join(self.directory, f'{g}_{h}.bin')
+        count = 0
+        with open(path, 'wb') as merged:
+            while True:
+                chunks = [(index, run[position:position + chunk_size]) for index, (run, position) in enumerate(zip(runs, positions)) if position < len(run)]
+                if not chunks:
+                    break
+                cutoff = min(chunk['fingerprint'][-1] for _, chunk in chunks)
+                parts = []
+                for index, chunk in chunks:
+                    end = int(np.searchsorted(chunk['fingerprint'], cutoff, side='right'))
+                    parts.append(np.array(chunk[:end]))
+                    positions[index] += end
+                records = np.concatenate(parts)
+                _, first = np.unique(records['fingerprint'], return_index=True)
+                records = records[first]
+                for fingerprints in closed:
+                    index = np.minimum(np.searchsorted(fingerprints, records['fingerprint']), len(fingerprints) - 1)
+                    records = records[fingerprints[index] != records['fingerprint']]
+                records.tofile(merged)
+                count += len(records)
+        del runs, chunks
+        for run_path in paths:
+            os.remove(run_path)
+        if count == 0:
+            os.remove(path)
+        return path, count
+
+    def load(self, path: 'str') -> 'np.memmap':
+        return np.memmap(path, dtype=self.dtype, mode='r')
+
+    def expand(self, state: 'State'):
+        for child in state.get_expanded_states():
+            h = self.heuristic.h(child)
+            if h == inf:
+                continue
+            self.add(child.g, int(h), self.get_child_record(state, child))
+
+    def add(self, g: 'int', h: 'int', record: 'tuple'):
+        self.buffers.setdefault((g, h), []).append(record)
+        self.buffered += 1
+        if self.buffered >= buffer_size:
+            self.flush()
+
+    def flush(self):
+        # Writes the buffered records out as one run file per bucket, sorted by fingerprint.
+        for bucket, records in self.buffers.items():
+            path = os.path.join(self.directory, f'run_{self.file_count}.bin')
+            self.file_count += 1
+            records = np.array(records, dtype=self.dtype)
+            records[np.argsort(records['fingerprint'], kind='stable')].tofile(path)
+            self.runs.setdefault(bucket, []).append(path)
+        self.buffers.clear()
+        self.buffered = 0
+
+    def get_record(self, state: 'State', parent: 'int', action: 'int') -> 'tuple':
+        cell_ids = self.level.cell_ids
+        agents = [cell_ids[state.agents_map[name].row][state.agents_map[name].col] for name in self.agent_names]
+        boxes = [cell_ids[state.boxes_map[box_id].row][state.boxes_map[box_id].col] for box_id in self.box_ids]
+        return (state.__hash__(), parent, action, agents, boxes)
+
+    def get_child_record(self, state: 'State', child: 'State') -> 'tuple':
+        # steps of the joint action, several for children reached by a tunnel macro
+        steps = child.macro if child.macro is not None else [child.joint_action]
+        key = tuple(tuple(joint_action) for joint_action in steps)
+        action = self.joint_action_ids.get(key)
+        if action is None:
+            action = len(self.joint_actions)
+            self.joint_action_ids[key] = action
+            self.joint_actions.append(steps)
+        return self.get_record(child, state.__hash__(), action)
+
+    def get_state(self, record: 'np.void', g: 'int') -> 'State':
+        # Rebuilds the state of a record, everything but the positions is taken from the root.
+        # Only the rows boxes are in are copied from empty_boxes, see State.result.
+        root = self.root
+        cells = self.level.cells
+        boxes = self.empty_boxes[:]
+        copied_rows = set()
+        agents_map = {}
+        for name, cell in zip(self.agent_names, record['agents']):
+            agent = root.agents_map[name]
+            row, col = cells[cell]
+            agents_map[name] = Agent(type=agent.type, color=agent.color, row=row, col=col)
+        boxes_map = {}
+        for box_id, cell in zip(self.box_ids, record['boxes']):
+            box = root.boxes_map[box_id]
+            row, col = cells[cell]
+            boxes_map[box_id] = Box(id=box.id, color=box.color, row=row, col=col, type=box.type)
+            if row not in copied_rows:
+                boxes[row] = boxes[row][:]
+                copied_rows.add(row)
+            boxes[row][col] = box_id
+        state = State(self.level, boxes, agents_map, boxes_map, reservations=root.reservations)
+        state.goals = root.goals
+        state.goals_map = root.goals_map
+        state.num_goals = root.num_goals
+        state.agents_only = root.agents_only
+        state.g = g
+        state._hash = int(record['fingerprint'])
+        return state
+
+    def find_record(self, fingerprint: 'int', g: 'int') -> 'np.void':
+        # The expanded record with fingerprint at depth g, by binary search in the sorted buckets.
+        fingerprint = np.uint64(fingerprint)
+        for buckets in self.expanded.values():
+            path = buckets.get(g)
+            if path is None:
+                continue
+            records = self.load(path)
+            index = np.searchsorted(records['fingerprint'], fingerprint)
+            if index < len(records) and records['fingerprint'][index] == fingerprint:
+                return records[index]
+        raise KeyError(f'No record of state {fingerprint} at depth {g}')
+
+    def extract_plan_with_locations(self, record: 'np.void', g: 'int'):
+        plan = []
+        while record['action'] != -1:
+            steps = self.joint_actions[record['action']]
+            plan.extend(reversed(steps))
+            g -= len(steps)
+            record = self.find_record(int(record['parent']), g)
+        plan.reverse()
+        # locations of agent '0' are replayed from the root, see NodeStore.extract_plan_with_locations
+        locations = []
+        row, col = self.root.get_agent_location('0')
+        for joint_action in plan:
+            row += joint_action[0].agent_row_delta
+            col += joint_action[0].agent_col_delta
+            locations.append((row, col))
+        return plan, locations
+
+    def get_slice(self, records: 'np.memmap', start: 'int', g: 'int'):
+        # States of the records of a bucket from start on, each with the plan to it.
+        for record in records[start:]:
+            plan, locations = self.extract_plan_with_locations(record, g)
+            yield self.get_state(record, g), plan, locations
+
+    def print_status(self, g: 'int', h: 'int'):
+        files = sum(len(buckets) for buckets in self.expanded.values())
+        print(f'External A*: expanded {self.expanded_count:,} states, bucket g={g} h={h}, {files} closed files, Alloc: {memory.get_usage():4.2f} MB', file=sys.stderr, flush=True)
@@ -1,8 +1,12 @@
 from abc import ABCMeta, abstractmethod
 from collections import deque
 from heapq import heappop, heappush
+from math import inf
 import itertools
 
+# placeholder for the state of a replaced FrontierBestFirst entry
+REMOVED = object()
+
 class Frontier(metaclass=ABCMeta):
     @abstractmethod
     def add(self, state: 'State'): raise NotImplementedError
@@ -32,6 +36,8 @@ class FrontierBFS(Frontier):
         self.set = set()
     
     def add(self, state: 'State'):
+        if state in self.set:
+            return
         self.queue.append(state)
         self.set.add(state)
     
@@ -63,13 +69,17 @@ class FrontierDFS(Frontier):
         self.set = set()
     
     def add(self, state: 'State'):
+        if state in self.set:
+            return
         self.stack.append(state)
         self.set.add(state)
     
     def pop(self) -> 'State':
         if len(self.stack) < 1:
             return None
-        return self.stack.pop()
+        state = self.stack.pop()
+        self.set.remove(state)
+        return state
 
     def is_empty(self) -> 'bool':
         return len(self.stack) == 0
@@ -88,6 +98,11 @@ class FrontierDFS(Frontier):
         self.set.clear()
 
 class FrontierBestFirst(Frontier):
+    '''
+    Priority queue ordered by heuristic.f. Adding a state the frontier already holds replaces
+    it (decrease-key when it was reached by a cheaper path): the old entry is marked removed
+    and skipped once it reaches the top of the heap, so entry_finder only holds live states.
+    '''
     def __init__(self, heuristic: 'Heuristic'):
         super().__init__()
         self.heuristic = heuristic
@@ -96,20 +111,30 @@ class FrontierBestFirst(Frontier):
         self.counter = itertools.count()  # unique sequence count
         
     def add(self, state: 'State'):
+        if state in self.entry_finder:
+            self.remove(state)
         count = next(self.counter)
-        entry = (self.heuristic.f(state), count, state)
+        entry = [self.heuristic.f(state), count, state]
         self.entry_finder[state] = entry
         heappush(self.pq, entry)
+
+    def remove(self, state: 'State'):
+        entry = self.entry_finder.pop(state)
+        entry[-1] = REMOVED
     
     def pop(self) -> 'State':
-        (h, count, state) = heappop(self.pq)
-        return state
+        while self.pq:
+            (f, count, state) = heappop(self.pq)
+            if state is not REMOVED:
+                del self.entry_finder[state]
+                return state
+        raise KeyError('pop from an empty frontier')
     
     def is_empty(self) -> 'bool':
-        return len(self.pq) == 0
+        return len(self.entry_finder) == 0
     
     def size(self) -> 'int':
-        return len(self.pq)
+        return len(self.entry_finder)
     
     def contains(self, state: 'State') -> 'bool':
         return state in self.entry_finder 
@@ -121,3 +146,167 @@ class FrontierBestFirst(Frontier):
         self.pq.clear()
         self.entry_finder.clear()
         self.counter = itertools.count()
+
+class FrontierBucket(Frontier):
+    '''
+    Best-first search with an open list of buckets instead of a heap: buckets[f][h] holds the
+    states with that f and h, so states with equal f are popped lowest h (highest g) first,
+    and in LIFO or FIFO order within a bucket. f and h are small integers in this domain, so
+    add and pop are O(1) apart from moving the min_f pointer past empty buckets. Non-integer
+    f (WA* with a fractional weight) are floored, states with an infinite f are popped last.
+    Adding a state the frontier holds replaces it, the old copy is skipped when popped.
+    '''
+    def __init__(self, heuristic: 'Heuristic', lifo: 'bool' = True):
+        super().__init__()
+        self.heuristic = heuristic
+        self.lifo = lifo
+        self.buckets = []  # f -> h -> states
+        self.min_h = []  # f -> lowest h with a state in buckets[f], inf for none
+        self.min_f = 0  # lowest f with a state in buckets
+        self.unbounded = deque()  # states with an infinite f or h
+        self.entries = {}  # state -> the copy of it that is live in the buckets
+
+    def add(self, state: 'State'):
+        f = self.heuristic.f(state)
+        h = self.heuristic.h(state)
+        if f == inf or h == inf:
+            self.unbounded.append(state)
+        else:
+            f = int(f)
+            h = int(h)
+            while len(self.buckets) <= f:
+                self.buckets.append([])
+                self.min_h.append(inf)
+            bucket = self.buckets[f]
+            while len(bucket) <= h:
+                bucket.append(deque())
+            bucket[h].append(state)
+            if h < self.min_h[f]:
+                self.min_h[f] = h
+            if f < self.min_f:
+                self.min_f = f
+        self.entries[state] = state
+
+    def pop(self) -> 'State':
+        while self.min_f < len(self.buckets):
+            bucket = self.buckets[self.min_f]
+            h = self.min_h[self.min_f]
+            while h < len(bucket):
+                states = bucket[h]
+                while states:
+                    self.min_h[self.min_f] = h
+                    state = states.pop() if self.lifo else states.popleft()
+                    if self.entries.get(state) is state:
+                        del self.entries[state]
+                        return state
+                h += 1
+            self.min_h[self.min_f] = inf
+            self.min_f += 1
+        while self.unbounded:
+            state = self.unbounded.popleft()
+            if self.entries.get(state) is state:
+                del self.entries[state]
+                return state
+        raise KeyError('pop from an empty frontier')
+
+    def is_empty(self) -> 'bool':
+        return len(self.entries) == 0
+
+    def size(self) -> 'int':
+        return len(self.entries)
+
+    def contains(self, state: 'State') -> 'bool':
+        return state in self.entries
+
+    def get_name(self):
+        return 'best-first search using {} ({} buckets)'.format(self.heuristic, 'LIFO' if self.lifo else 'FIFO')
+
+    def clear(self):
+        self.buckets.clear()
+        self.min_h.clear()
+        self.min_f = 0
+        self.unbounded.clear()
+        self.entries.clear()
+
+class OpenList:
+    # One open list of FrontierMultiQueue, popped when its priority is the lowest.
+    __slots__ = ('heuristic', 'preferred_only', 'boost', 'priority', 'pq', 'best_h')
+
+    def __init__(self, heuristic: 'Heuristic', preferred_only: 'bool', boost: 'int'):
+        self.heuristic = heuristic
+        self.preferred_only = preferred_only
+        self.boost = boost
+        self.priority = 0
+        self.pq = []
+        self.best_h = None
+
+class FrontierMultiQueue(Frontier):
+    '''
+    Best-first search alternating between one open list per heuristic, plus an open list of
+    the states reached by preferred actions (see HeuristicAStar.is_preferred) ordered by the
+    first heuristic. The open list that has been popped the least is popped next. Whenever an
+    open list pops a state with a lower h, by its own heuristic, than it has popped before, that
+    open list is boosted by its boost, i.e. is popped that many more times in a row, so the
+    search can follow the heuristic that made progress.
+    A state is in every open list it was added to, copies left behind once it is popped are
+    skipped.
+    '''
+    def __init__(self, heuristics: '[Heuristic, ...]', boosts: '[int, ...]' = None, preferred_boost: 'int' = 1000):
+        super().__init__()
+        # the first heuristic orders the preferred open list and decides which states are preferred
+        self.heuristic = heuristics[0]
+        if boosts is None:
+            boosts = [0] * len(heuristics)
+        self.queues = [OpenList(heuristic, False, boost) for heuristic, boost in zip(heuristics, boosts)]
+        if preferred_boost is not None:
+            self.queues.append(OpenList(self.heuristic, True, preferred_boost))
+        self.entry_finder = {}  # mapping of states to their count
+        self.counter = itertools.count()  # unique sequence count
+
+    def add(self, state: 'State'):
+        count = next(self.counter)
+        self.entry_finder[state] = count
+        preferred = None
+        for queue in self.queues:
+            if queue.preferred_only:
+                if preferred is None:
+                    preferred = self.heuristic.is_preferred(state)
+                if not preferred:
+                    continue
+            heappush(queue.pq, (queue.heuristic.f(state), count, state))
+
+    def pop(self) -> 'State':
+        while True:
+            queue = min((queue for queue in self.queues if queue.pq), key=lambda queue: queue.priority)
+            queue.priority += 1
+            pq = queue.pq
+            while pq:
+                (f, count, state) = heappop(pq)
+                if self.entry_finder.get(state) == count:
+                    del self.entry_finder[state]
+                    h = queue.heuristic.h(state)
+                    if queue.best_h is None or h < queue.best_h:
+                        queue.best_h = h
+                        queue.priority -= queue.boost
+                    return state
+
+    def is_empty(self) -> 'bool':
+        return len(self.entry_finder) == 0
+
+    def size(self) -> 'int':
+        return len(self.entry_finder)
+
+    def contains(self, state: 'State') -> 'bool':
+        return state in self.entry_finder
+
+    def get_name(self):
+        names = ', '.join(str(queue.heuristic) + (' (preferred)' if queue.preferred_only else '') for queue in self.queues)
+        return 'multi-queue best-first search using {}'.format(names)
+
+    def clear(self):
+        for queue in self.queues:
+            queue.priority = 0
+            queue.pq.clear()
+            queue.best_h = None
+        self.entry_finder.clear()
+        self.counter = itertools.count()
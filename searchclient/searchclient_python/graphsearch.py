@@ -2,15 +2,16 @@
 import time
 import sys
 import copy
-from action import Action
+from action import Action, get_box_result_location
 from ct import CBS
 from substate import update_state, get_reduced_state, match_goal
 from algorithms import subsearch
 from state import State
+from config import Config
 from conflicts import find_conflicts
 from deadlock import solve_deadlock, find_deadlock
 
-def merge(plans: dict, max_plan_length: int) -> list[list[Action]]:
+def merge(plans: dict, max_plan_length: int, num_agents: int) -> list[list[Action]]:
     # plans is a dict with a list of actions for each agent like this
     # { '0': [action0, action1, ...], '1': [action0, action1, ...], ... } 
     # agents are represented by their id ('0', '1', ...)
@@ -24,7 +25,7 @@ def merge(plans: dict, max_plan_length: int) -> list[list[Action]]:
     full_plan = []
     for step in range(max_plan_length):
         actions = []
-        for agent in range(State.num_agents):
+        for agent in range(num_agents):
             if str(agent) not in plans.keys() or len(plans[str(agent)]) <= step:
                 # for now do NoOp but it's probably wrong, an idea could be going backwards to the starting position
                 actions.append(Action.NoOp)
@@ -35,24 +36,53 @@ def merge(plans: dict, max_plan_length: int) -> list[list[Action]]:
         full_plan.append(actions)
     return full_plan  
 
+def find_invalid_step(state: State, plan: list[list[Action]]) -> tuple:
+    # first joint action that is not applicable or has conflicts from state on, as (step, agent, state before it)
+    for step, joint_action in enumerate(plan):
+        for agent, action in enumerate(joint_action):
+            if not state.is_applicable(agent, action) or state.is_conflicting_with(joint_action[:agent], agent, action):
+                return step, agent, state
+        state = state.result(joint_action)
+    return None
+
+def is_valid_plan(state: State, plan: list[list[Action]]) -> bool:
+    return find_invalid_step(state, plan) is None
+
+def is_goal_solved(state: State, goal) -> bool:
+    if goal.type.isdigit(): # agent goal
+        return state.get_agent_location(goal.type) == (goal.row, goal.col)
+    box = state.boxes[goal.row][goal.col]
+    return box != '' and state.boxes_map[box].type == goal.type
+
 def count_neighbors(state: State, loc: tuple[int, int]) -> int:
     count = 0
-    if loc[0] > 0 and state.walls[loc[0] - 1][loc[1]] == False:
+    if loc[0] > 0 and state.level.walls[loc[0] - 1][loc[1]] == False:
         count += 1
-    if loc[0] < State.num_rows - 1 and state.walls[loc[0] + 1][loc[1]] == False:
+    if loc[0] < state.level.num_rows - 1 and state.level.walls[loc[0] + 1][loc[1]] == False:
         count += 1
-    if loc[1] > 0 and state.walls[loc[0]][loc[1] - 1] == False:
+    if loc[1] > 0 and state.level.walls[loc[0]][loc[1] - 1] == False:
         count += 1
-    if loc[1] < State.num_cols - 1 and state.walls[loc[0]][loc[1] + 1] == False:
+    if loc[1] < state.level.num_cols - 1 and state.level.walls[loc[0]][loc[1] + 1] == False:
         count += 1
     return count
 
-def search(state: State, frontier) -> list[list[Action]]:
+def get_box_locations(box_location: tuple[int, int], agent_plan: list, agent_locations: list) -> list[tuple[int, int]]:
+    # cell of the box after each action of agent_plan, which moves no other box
+    box_locations = []
+    for joint_action, agent_location in zip(agent_plan, agent_locations):
+        box_location = get_box_result_location(joint_action[0], agent_location) or box_location
+        box_locations.append(box_location)
+    return box_locations
+
+def search(state: State, frontier, config: Config, weights: list = None, time_limit: float = None, deferred: tuple = ()) -> list[list[Action]]:
+    # deferred goals are solved after all the others, in the order they were deferred
     initial_state = copy.deepcopy(state)
+    start_state = copy.deepcopy(state) # CBS changes initial_state, the merged plan is checked from a copy
     plans = {}
     locations = {}
+    agent_goals = {} # goals solved by each agent, in the order of its plan
     goals = state.goals_map
-    solving_queue = list(goals.keys())
+    solving_queue = [key for key in goals.keys() if key not in deferred] + list(deferred)
     seen = []
 
     for key in solving_queue:
@@ -86,7 +116,18 @@ def search(state: State, frontier) -> list[list[Action]]:
         if reduced_state.is_subgoal_state():
             continue
         
-        agent_plan, agent_locations = subsearch(reduced_state, frontier)
+        solution = subsearch(reduced_state, frontier, config, weights, time_limit)
+        if solution is None and config.reserve_paths:
+            # waiting is not part of a state, so the reserved paths can cut off every plan
+            print(f'No plan around reserved paths for goal {goals[key].type}, retrying without them', file=sys.stderr, flush=True)
+            frontier.clear()
+            reduced_state.reservations.clear_paths()
+            solution = subsearch(reduced_state, frontier, config, weights, time_limit)
+        if solution is None:
+            print(f'No plan found for goal {goals[key].type}, leaving it unsolved', file=sys.stderr, flush=True)
+            frontier.clear()
+            continue
+        agent_plan, agent_locations = solution
         
         # 4. find and solve deadlocks
         solved_deadlock = False
@@ -99,7 +140,7 @@ def search(state: State, frontier) -> list[list[Action]]:
             locations=locations, 
         )
         if deadlock is not None:
-            plans, locations, state = solve_deadlock(
+            repair = solve_deadlock(
                 state=state,
                 plans=plans, 
                 locations=locations, 
@@ -107,12 +148,31 @@ def search(state: State, frontier) -> list[list[Action]]:
                 locked_agent=match["agent"].type,
                 locked_plan=agent_plan,
                 locked_locations=agent_locations,
-                index=deadlock
+                index=deadlock,
+                config=config,
+                heuristic=getattr(frontier, 'heuristic', None),
+                weights=weights,
+                time_limit=time_limit,
             )
-            print(f"Deadlock solved", file=sys.stderr, flush=True)
-            solved_deadlock = True
+            if repair is None and key not in seen:
+                # the goal is solved again once the others have moved the boxes
+                solving_queue.append(key)
+                seen.append(key)
+                frontier.clear()
+                continue
+            if repair is not None:
+                plans, locations, state = repair
+                print(f"Deadlock solved", file=sys.stderr, flush=True)
+                solved_deadlock = True
         
         if not solved_deadlock:
+            if config.reserve_paths: # later goals plan around this agent and its box
+                # from the step the plan starts at, when they are still where match found them
+                agent_location = (match["agent"].row, match["agent"].col)
+                state.reservations.reserve_path([agent_location] + agent_locations, g - 1)
+                if "box" in match:
+                    box_location = (match["box"].row, match["box"].col)
+                    state.reservations.reserve_path([box_location] + get_box_locations(box_location, agent_plan, agent_locations), g - 1)
             if match["agent"].type in plans.keys(): # if agent already has a plan append to it
                 plans[match["agent"].type] += agent_plan
                 locations[match["agent"].type] += agent_locations
@@ -120,7 +180,8 @@ def search(state: State, frontier) -> list[list[Action]]:
                 locations[match["agent"].type] = agent_locations
                 plans[match["agent"].type] = agent_plan
 
-        state = update_state(state, match, agent_locations)
+        agent_goals.setdefault(match["agent"].type, []).append(key)
+        state = update_state(state, match, agent_locations, len(locations[match["agent"].type]))
         frontier.clear()
 
     goalless_agents = [agent for agent in state.agents_map if agent not in plans.keys()]
@@ -129,11 +190,11 @@ def search(state: State, frontier) -> list[list[Action]]:
     for agent in goalless_agents:
         if agent not in plans.keys():
             plans[agent] = [[Action.NoOp]] * max_length
-            locations[agent] = [State.initial_agents_locs[agent]] * max_length
+            locations[agent] = [state.level.initial_agents_locs[agent]] * max_length
         
     
     # 5. find and solve conflicts
-    conflicts = find_conflicts(plans=plans, locations=locations)
+    conflicts = find_conflicts(plans=plans, locations=locations, level=state.level)
 
     # 6. Run CBS
     tree = CBS(initial_state=initial_state, plans=plans, locations=locations, conflicts=conflicts)
@@ -145,6 +206,22 @@ def search(state: State, frontier) -> list[list[Action]]:
             max_length = max(max_length, len(loc))
 
     # 7. Merge the plans with some strategy (we can get it from papers or come up with a simple one)
-    final_plan = merge(solving_plans, max_length)
+    final_plan = merge(solving_plans, max_length, state.level.num_agents)
+    invalid = find_invalid_step(start_state, final_plan)
+    if invalid is not None:
+        # the goal plans can clash in ways CBS and the deadlock repair do not fix,
+        # e.g. a plan running through a goal cell another agent has already filled
+        frontier.clear()
+        if config.reserve_paths:
+            print('Plan around reserved paths is not valid, searching again without them', file=sys.stderr, flush=True)
+            return search(start_state, frontier, config.replace(reserve_paths=False), weights, time_limit, deferred)
+        step, agent, step_state = invalid
+        # the first goal of that agent left unsolved is planned again after all the others, around their goal cells
+        unsolved = [key for key in agent_goals.get(str(agent), []) if not is_goal_solved(step_state, goals[key])]
+        if unsolved and unsolved[0] not in deferred:
+            print(f'Merged plan is not valid at step {step}, solving goal {goals[unsolved[0]].type} after the others', file=sys.stderr, flush=True)
+            return search(start_state, frontier, config, weights, time_limit, deferred + (unsolved[0],))
+        print(f'Merged plan is not valid at step {step}', file=sys.stderr, flush=True)
+        return None
     return final_plan
 
@@ -1,6 +1,8 @@
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
 import sys
-from state import State
+from math import inf
+from state import State, PartialState
 import pprint as pp
 
 class Heuristic(metaclass=ABCMeta):    
@@ -16,18 +18,298 @@ class Heuristic(metaclass=ABCMeta):
 class HeuristicAStar(Heuristic):
     def __init__(self, initial_state: 'State'):
         super().__init__(initial_state)
+        # goals grouped by type for the goals_map they were built from, see get_goals
+        self._goals_map = None
+        self._box_goals = None
+        self._agent_goals = None
+        self._search_goals_map = None
+        self._search_key = None
+        # h values by positional signature, see get_signature, at most config.h_cache of them
+        self.cache_size = initial_state.level.config.h_cache
+        self.cache = OrderedDict() if self.cache_size > 0 else None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._search_keys = {}
+        # state the last intermediate states were built from and its h, see get_partial_h
+        self._partial_base = None
+        self._partial_base_h = None
     
     def f(self, state: 'State') -> 'int':
         return state.g + self.h(state)
 
     def h(self, state: 'State') -> 'int':
-        if state.agents_only:
-            agent_to_goal = abs(state.goals_map[0].row - state.agents_map['0'].row) + abs(state.goals_map[0].col - state.agents_map['0'].col)
-            return agent_to_goal
-        else:
-            agent_to_box = abs(state.boxes_map[0].row - state.agents_map['0'].row) + abs(state.boxes_map[0].col - state.agents_map['0'].col)
-            box_to_goal = abs(state.goals_map[0].row - state.boxes_map[0].row) + abs(state.goals_map[0].col - state.boxes_map[0].col)
-            return agent_to_box + box_to_goal
+        '''
+        Lower bound on the number of joint actions left. An agent moves at most one box one
+        cell per action, so the agents of a color need at least the minimum-cost matchings of
+        the boxes of that color to goals of their type, shared among them, after the nearest of
+        them has walked up to such a box. Agents work in parallel, so h is the largest of these
+        over colors and of the distances of agents to their goals, never their sum.
+        Distances are true distances around walls, see Level.get_distances.
+        Values are cached by positional signature, so states met again in later subsearches
+        and deadlock searches on the same goals are not evaluated again.
+        '''
+        if isinstance(state, PartialState):
+            return self.get_partial_h(state)
+        if self.cache is None:
+            return self.evaluate(state)
+        key = self.get_signature(state)
+        entry = self.cache.get(key)
+        if entry is not None:
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+            h, costs = entry
+            # children match only the box types they moved again, see get_matching_costs
+            if state.h_costs is None:
+                state.h_costs = costs
+            return h
+        self.cache_misses += 1
+        h = self.evaluate(state)
+        self.cache[key] = (h, state.h_costs)
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return h
+
+    def get_partial_h(self, state: 'PartialState') -> 'int':
+        '''
+        h of an intermediate state of operator decomposition, which has the g of its state. The
+        joint action it builds takes one step, after which the agents with a pending action are
+        where it takes them, so h is at least one more than their distances to their goals.
+        h is also at least that of the state, so the f of every intermediate state is a lower
+        bound for the f of the states it leads to, and the agents picked so far already count.
+        '''
+        if state.h is not None:
+            return state.h
+        base = state.state
+        # the intermediate states of an expansion share their state and are added one after another
+        if base is not self._partial_base:
+            self._partial_base = base
+            self._partial_base_h = self.h(base)
+        h = self._partial_base_h
+        _, agent_goals = self.get_goals(base.goals_map)
+        for agent, action in enumerate(state.pending):
+            goal = agent_goals.get(str(agent))
+            if goal is not None:
+                row, col = base.get_agent_location(str(agent))
+                h = max(h, 1 + base.level.distance((row + action.agent_row_delta, col + action.agent_col_delta), (goal.row, goal.col)))
+        state.h = h
+        return h
+
+    def evaluate(self, state: 'State') -> 'int':
+        level = state.level
+        box_goals, agent_goals = self.get_goals(state.goals_map)
+
+        box_moves = {}
+        for box_type, cost in self.get_matching_costs(state, box_goals).items():
+            color = level.colors[box_type]
+            box_moves[color] = box_moves.get(color, 0) + cost
+        num_agents = {}
+        for agent in state.agents_map.values():
+            num_agents[agent.color] = num_agents.get(agent.color, 0) + 1
+        agent_to_box = self.get_agent_to_box(state, box_goals)
+
+        h = 0
+        for color, moves in box_moves.items():
+            if moves == 0:
+                continue
+            if moves == inf or color not in num_agents:
+                return inf
+            h = max(h, agent_to_box.get(color, 0) + -(-moves // num_agents[color]))
+        for goal in agent_goals.values():
+            h = max(h, level.distance(self.get_goal_agent_location(state, goal), (goal.row, goal.col)))
+        return h
+
+    def get_goals(self, goals_map: 'dict') -> 'tuple':
+        # goals_map is shared by all states of a search, so this only runs once per search
+        if goals_map is not self._goals_map:
+            self._goals_map = goals_map
+            self._box_goals = {}
+            self._agent_goals = {}
+            for goal in goals_map.values():
+                if goal.type.isdigit():
+                    self._agent_goals[goal.type] = goal
+                else:
+                    self._box_goals.setdefault(goal.type, []).append((goal.row, goal.col))
+        return self._box_goals, self._agent_goals
+
+    def get_signature(self, state: 'State') -> 'tuple':
+        '''
+        The state fingerprint (Zobrist hash of the agent and box cells) together with a small
+        id for the goals and agent colors of the search, which is all h depends on.
+        '''
+        # like get_goals, this only runs once per search
+        if state.goals_map is not self._search_goals_map:
+            self._search_goals_map = state.goals_map
+            goals = frozenset((goal.row, goal.col, goal.type) for goal in state.goals_map.values())
+            colors = tuple(sorted((name, agent.color) for name, agent in state.agents_map.items()))
+            self._search_key = self._search_keys.setdefault((goals, colors), len(self._search_keys))
+        return (self._search_key, state.__hash__())
+
+    def get_cache_status(self) -> 'str':
+        lookups = self.cache_hits + self.cache_misses
+        hit_rate = self.cache_hits / lookups if lookups else 0.0
+        return 'Heuristic cache: {:,} hits, {:,} misses ({:.1%} hit rate), {:,} entries'.format(self.cache_hits, self.cache_misses, hit_rate, len(self.cache))
+
+    def get_matching_costs(self, state: 'State', box_goals: 'dict') -> 'dict':
+        '''
+        Matching cost per box type, stored in state.h_costs. Only the types of the boxes moved
+        since the parent state are matched again, the others are copied from the parent.
+        '''
+        if state.h_costs is not None:
+            return state.h_costs
+        parent = state.parent
+        parent_costs = parent.h_costs if parent is not None else None
+        boxes_map = state.boxes_map
+        if parent_costs is not None:
+            parent_boxes_map = parent.boxes_map
+            # moved boxes are new Box records, see State.result
+            moved_types = {box.type for box_id, box in boxes_map.items() if parent_boxes_map.get(box_id) is not box}
+
+        costs = {}
+        for box_type, goal_cells in box_goals.items():
+            if parent_costs is not None and box_type not in moved_types:
+                costs[box_type] = parent_costs[box_type]
+                continue
+            box_cells = [(box.row, box.col) for box in boxes_map.values() if box.type == box_type]
+            distances = [[state.level.distance(box_cell, goal_cell) for box_cell in box_cells] for goal_cell in goal_cells]
+            costs[box_type] = min_cost_assignment(distances)
+        state.h_costs = costs
+        return costs
+
+    def get_progress(self, state: 'State') -> 'int':
+        '''
+        Sum of the box matchings and the agent goal distances, which only goes down when a
+        box or agent gets closer to its goal, unlike h.
+        '''
+        if isinstance(state, PartialState):
+            state = state.state
+        level = state.level
+        box_goals, agent_goals = self.get_goals(state.goals_map)
+
+        progress = sum(self.get_matching_costs(state, box_goals).values())
+        for goal in agent_goals.values():
+            progress += level.distance(self.get_goal_agent_location(state, goal), (goal.row, goal.col))
+        return progress
+
+    def is_preferred(self, state: 'State') -> 'bool':
+        # state is reached by a preferred action if it brought a box (or agent) closer to its goal
+        if isinstance(state, PartialState):
+            state = state.state
+        parent = state.parent
+        if parent is None or parent.h_costs is None:
+            return False
+        return self.get_progress(state) < self.get_progress(parent)
+
+    def get_agent_to_box(self, state: 'State', box_goals: 'dict') -> 'dict':
+        # Moves the agents of each color need at least before one of them can move a box of
+        # that color that is off its goals, by color.
+        level = state.level
+        agent_to_box = {}
+        for agent in state.agents_map.values():
+            for box in state.boxes_map.values():
+                if box.color != agent.color or box.type not in box_goals or (box.row, box.col) in box_goals[box.type]:
+                    continue
+                distance = level.distance((agent.row, agent.col), (box.row, box.col)) - 1
+                if distance < agent_to_box.get(agent.color, inf):
+                    agent_to_box[agent.color] = distance
+        return agent_to_box
+
+    @staticmethod
+    def get_goal_agent_location(state: 'State', goal: 'Goal') -> 'tuple[int, int]':
+        # reduced states rename their only agent to '0'
+        if goal.type in state.agents_map:
+            return state.get_agent_location(goal.type)
+        return state.get_agent_location('0')
+    
+    def __repr__(self):
+        return 'A* evaluation'
+
+
+class HeuristicWeightedAStar(HeuristicAStar):
+    def __init__(self, initial_state: 'State', w: 'float'):
+        super().__init__(initial_state)
+        self.w = w
+    
+    def f(self, state: 'State') -> 'int':
+        return state.g + self.w * self.h(state)
+    
+    def __repr__(self):
+        return 'WA*({}) evaluation'.format(self.w)
+
+class HeuristicGreedy(HeuristicAStar):
+    def __init__(self, initial_state: 'State'):
+        super().__init__(initial_state)
+    
+    def f(self, state: 'State') -> 'int':
+        return self.h(state)
     
     def __repr__(self):
-        return 'A* evaluation'
\ No newline at end of file
+        return 'greedy evaluation'
+
+class HeuristicBoxProgress(HeuristicAStar):
+    def __init__(self, initial_state: 'State'):
+        super().__init__(initial_state)
+
+    def f(self, state: 'State') -> 'int':
+        return self.get_progress(state)
+
+    def __repr__(self):
+        return 'box progress evaluation'
+
+
+def min_cost_assignment(costs: 'list') -> 'int':
+    '''
+    Cost of the cheapest assignment of every row of costs to a different column, or of every
+    column to a different row when there are more rows than columns (Hungarian algorithm,
+    O(n^2 m) for n <= m). Unreachable pairs cost inf, and so does an assignment needing one.
+    '''
+    if not costs or not costs[0]:
+        return 0
+    if len(costs) > len(costs[0]):
+        costs = [list(column) for column in zip(*costs)]
+    if len(costs) == 1:
+        return min(costs[0])
+
+    # inf would break the potentials, unreachable pairs get a cost no real matching reaches
+    big = 1 + sum(max((cost for cost in row if cost != inf), default=0) for row in costs)
+    costs = [[big if cost == inf else cost for cost in row] for row in costs]
+
+    n, m = len(costs), len(costs[0])
+    u = [0] * (n + 1)
+    v = [0] * (m + 1)
+    match = [0] * (m + 1)  # column -> row assigned to it (1-based, 0 for none)
+    way = [0] * (m + 1)
+    for row in range(1, n + 1):
+        match[0] = row
+        column = 0
+        min_values = [inf] * (m + 1)
+        used = [False] * (m + 1)
+        while True:
+            used[column] = True
+            current_row = match[column]
+            delta = inf
+            next_column = 0
+            for j in range(1, m + 1):
+                if not used[j]:
+                    reduced = costs[current_row - 1][j - 1] - u[current_row] - v[j]
+                    if reduced < min_values[j]:
+                        min_values[j] = reduced
+                        way[j] = column
+                    if min_values[j] < delta:
+                        delta = min_values[j]
+                        next_column = j
+            for j in range(m + 1):
+                if used[j]:
+                    u[match[j]] += delta
+                    v[j] -= delta
+                else:
+                    min_values[j] -= delta
+            column = next_column
+            if match[column] == 0:
+                break
+        while column:
+            previous = way[column]
+            match[column] = match[previous]
+            column = previous
+
+    cost = sum(costs[match[j] - 1][j - 1] for j in range(1, m + 1) if match[j])
+    return inf if cost >= big else cost
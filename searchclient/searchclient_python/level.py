@@ -0,0 +1,260 @@
+import random
+from math import inf
+from action import Action, ActionType
+from distances import get_distance_table, UNREACHABLE
+from config import Config
+
+# Cells of distance lists Level.get_cell_distances keeps, the oldest are dropped beyond it.
+cache_cells = 1000000
+
+
+class Level:
+    """
+        Static data of a level, built once by SearchClient.parse_level and referenced by every
+        state searched on it. Nothing in a level changes during a search, so it is frozen and
+        shared as is by copies and reduced states instead of being deep-copied with them.
+
+        Cells are numbered in row-major order, per-cell data (cells, neighbors, action_table)
+        are flat tuples indexed by cell id and cell_ids maps (row, col) to it.
+    """
+    __slots__ = (
+        'name',
+        'num_rows',
+        'num_cols',
+        'walls',
+        'colors',
+        'goals',
+        'goals_map',
+        'agents_only',
+        'num_agents',
+        'initial_agents_locs',
+        'cells',
+        'cell_ids',
+        'neighbors',
+        'action_table',
+        'zobrist',
+        'dead_cells',
+        'tunnels',
+        'distances',
+        'distance_table',
+        'distance_rows',
+        'config',
+        '_frozen',
+    )
+
+    def __init__(self, name, walls, colors, goals, goals_map, initial_agents_locs, box_types, config=None):
+        self.name = name
+        # settings of the run the level is searched in, see Config
+        self.config = config if config is not None else Config()
+        self.num_rows = len(walls)
+        self.num_cols = len(walls[0]) if walls else 0
+        self.walls = tuple(tuple(row) for row in walls)
+        self.colors = colors
+        self.goals = tuple(tuple(row) for row in goals)
+        self.goals_map = goals_map
+        self.agents_only = any(goal.type.isdigit() for goal in goals_map.values())
+        self.num_agents = len(initial_agents_locs)
+        self.initial_agents_locs = initial_agents_locs
+
+        self.cells, self.cell_ids = Level.get_cells(self.walls)
+        self.neighbors = Level.get_cells_neighbors(self.cells, self.cell_ids)
+        self.action_table = Level.get_action_table(self.cells, self.cell_ids)
+        self.zobrist = Level.get_zobrist_keys(self.num_rows, self.num_cols, colors)
+        self.dead_cells = Level.get_dead_cells(self.cells, self.cell_ids, self.neighbors, goals_map, box_types)
+        self.tunnels = Level.get_tunnels(self.cells, self.cell_ids, self.neighbors)
+        # source cell id -> BFS distances to every cell id, filled by get_distances, oldest first
+        self.distances = {}
+        # precomputed distances from the goal cells and agent start cells, see distances.py
+        self.distance_table, self.distance_rows = get_distance_table(self, self.config.distance_cache)
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise AttributeError(f'Level is immutable, cannot set {name}')
+        object.__setattr__(self, name, value)
+
+    # Levels are shared, never copied.
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def get_distances(self, row: 'int', col: 'int') -> 'list':
+        '''
+        True distances, ignoring boxes and agents, from (row, col) to every cell id (inf when
+        unreachable). Read from the distance table for goal and agent start cells, other
+        sources (cells boxes are on) get a BFS over neighbors the first time they are asked for.
+        At most cache_cells cells of distances are kept, so boxes visiting many cells during a
+        run do not make the cache grow without bound.
+        '''
+        return self.get_cell_distances(self.cell_ids[row][col])
+
+    def get_cell_distances(self, source: 'int') -> 'list':
+        distances = self.distances.get(source)
+        if distances is None and source in self.distance_rows:
+            distances = self.distance_table[self.distance_rows[source]].tolist()
+            distances = [inf if distance == UNREACHABLE else distance for distance in distances]
+            self.add_distances(source, distances)
+        if distances is None:
+            neighbors = self.neighbors
+            distances = [inf] * len(self.cells)
+            distances[source] = 0
+            layer = [source]
+            distance = 0
+            while layer:
+                distance += 1
+                next_layer = []
+                for cell in layer:
+                    for neighbor in neighbors[cell]:
+                        if distances[neighbor] is inf:
+                            distances[neighbor] = distance
+                            next_layer.append(neighbor)
+                layer = next_layer
+            self.add_distances(source, distances)
+        return distances
+
+    def add_distances(self, source: 'int', distances: 'list'):
+        if len(self.distances) >= max(1, cache_cells // len(self.cells)):
+            del self.distances[next(iter(self.distances))]
+        self.distances[source] = distances
+
+    def distance(self, start: 'tuple[int, int]', end: 'tuple[int, int]') -> 'int':
+        ''' Length of a shortest path from start to end, looked up in the distances from end. '''
+        start = self.cell_ids[start[0]][start[1]]
+        end = self.cell_ids[end[0]][end[1]]
+        if end not in self.distances and end not in self.distance_rows and start in self.distance_rows:
+            # distances are symmetric, use the table instead of a new BFS
+            start, end = end, start
+        return self.get_cell_distances(end)[start]
+
+    @staticmethod
+    def get_cells(walls):
+        # Cell id -> (row, col) and the grid lookup from (row, col) to cell id (None for walls).
+        # Cells on the outer rows are left out, levels are enclosed by walls.
+        cells = []
+        cell_ids = []
+        for row, line in enumerate(walls):
+            ids = []
+            for col, wall in enumerate(line):
+                if wall or row == 0 or row == len(walls) - 1:
+                    ids.append(None)
+                else:
+                    ids.append(len(cells))
+                    cells.append((row, col))
+            cell_ids.append(tuple(ids))
+        return tuple(cells), tuple(cell_ids)
+
+    @staticmethod
+    def get_cells_neighbors(cells, cell_ids):
+        # Cell ids of the up, down, left and right neighbours of every cell.
+        neighbors = []
+        for row, col in cells:
+            ids = []
+            for neighbor_row, neighbor_col in ((row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)):
+                if 0 <= neighbor_row < len(cell_ids) and 0 <= neighbor_col < len(cell_ids[neighbor_row]):
+                    if cell_ids[neighbor_row][neighbor_col] is not None:
+                        ids.append(cell_ids[neighbor_row][neighbor_col])
+            neighbors.append(tuple(ids))
+        return tuple(neighbors)
+
+    @staticmethod
+    def get_action_table(cells, cell_ids):
+        # For every cell id, the moves, pushes and pulls that walls alone allow from it, as
+        # (action, agent destination, box location, box destination) with None box cells for moves.
+        # Expansion then only has to check the dynamic occupancy of these cells.
+        def is_cell(row, col):
+            return 0 <= row < len(cell_ids) and 0 <= col < len(cell_ids[row]) and cell_ids[row][col] is not None
+
+        action_table = []
+        for row, col in cells:
+            entries = []
+            for action in Action:
+                agent_destination = (row + action.agent_row_delta, col + action.agent_col_delta)
+                if action.type is ActionType.Move:
+                    box_location = None
+                    box_destination = None
+                elif action.type is ActionType.Push:
+                    box_location = agent_destination
+                    box_destination = (agent_destination[0] + action.box_row_delta, agent_destination[1] + action.box_col_delta)
+                elif action.type is ActionType.Pull:
+                    box_location = (row - action.box_row_delta, col - action.box_col_delta)
+                    box_destination = (row, col)
+                else:
+                    continue
+                if not is_cell(*agent_destination):
+                    continue
+                if box_location is not None and not (is_cell(*box_location) and is_cell(*box_destination)):
+                    continue
+                entries.append((action, agent_destination, box_location, box_destination))
+            action_table.append(tuple(entries))
+        return tuple(action_table)
+
+    @staticmethod
+    def get_dead_cells(cells, cell_ids, neighbors, goals_map, box_types):
+        # For every box type whose boxes all have to end on a goal (no more boxes than goals),
+        # the cells from which such a box can never be moved onto a goal of its type.
+        # Found by flooding backwards from the goals: a box can move from a cell into a
+        # neighbour if the agent can push it, standing at another neighbour of the cell, or pull
+        # it, stepping on to another neighbour of the neighbour.
+        # With pulls and turning pushes that holds for every pair of neighbours but two dead
+        # ends facing each other, so the dead cells are those walled off from every goal of the
+        # type (a separate room) and the table is empty on most levels. Sokoban dead squares
+        # (corners, walls without goals) only exist for push-only boxes, which this domain has
+        # none of. Types left with no dead cells get no entry, so the lookups in
+        # State.get_applicable_actions stay cheap. Types with more boxes than goals are left out
+        # as their spare boxes may be parked anywhere.
+        goal_cells = {}
+        for goal in goals_map.values():
+            if not goal.type.isdigit():
+                goal_cells.setdefault(goal.type, []).append(cell_ids[goal.row][goal.col])
+
+        dead_cells = {}
+        for box_type, targets in goal_cells.items():
+            if box_types.count(box_type) > len(targets):
+                continue
+            live = set(targets)
+            stack = list(targets)
+            while stack:
+                cell = stack.pop()
+                for previous in neighbors[cell]:
+                    if previous in live:
+                        continue
+                    if len(neighbors[previous]) > 1 or len(neighbors[cell]) > 1:
+                        live.add(previous)
+                        stack.append(previous)
+            dead = frozenset(cells[cell] for cell in range(len(cells)) if cell not in live)
+            if dead:
+                dead_cells[box_type] = dead
+        return dead_cells
+
+    @staticmethod
+    def get_tunnels(cells, cell_ids, neighbors):
+        # Ids of the cells of one-wide corridors: cells with two neighbours that are either
+        # opposite each other or, in a bend, have a wall on the inner corner. Room corners also
+        # have two neighbours but an open inner corner, they are not tunnels.
+        tunnels = set()
+        for cell, ids in enumerate(neighbors):
+            if len(ids) != 2:
+                continue
+            (row, col), (row_1, col_1), (row_2, col_2) = cells[cell], cells[ids[0]], cells[ids[1]]
+            if row_1 == row_2 or col_1 == col_2:
+                tunnels.add(cell)
+            else:
+                # the inner corner is diagonal to cell, across from both neighbours
+                corner_row, corner_col = row_1 + row_2 - row, col_1 + col_2 - col
+                if cell_ids[corner_row][corner_col] is None:
+                    tunnels.add(cell)
+        return frozenset(tunnels)
+
+    @staticmethod
+    def get_zobrist_keys(num_rows, num_cols, colors):
+        # One fixed random 64-bit key per (entity, cell), so a state hash is the XOR of
+        # the keys of its agents and boxes and can be updated incrementally when they move.
+        # Agent '0' is always included since reduced states rename their agent to '0'.
+        rng = random.Random(0)
+        entities = set(colors.keys()) | {'0'}
+        return {
+            entity: tuple(tuple(rng.getrandbits(64) for _ in range(num_cols)) for _ in range(num_rows))
+            for entity in sorted(entities)
+        }
@@ -1,7 +1,5 @@
-from math import inf
 import psutil
 
-max_usage = inf
 _process = psutil.Process()
 
 def get_usage() -> 'float':
@@ -0,0 +1,70 @@
+from array import array
+from action import Action
+
+
+class NodeStore:
+    """
+        Compact record of the nodes expanded by a search, kept in parallel arrays instead of
+        State objects: parent index and joint action id, two machine words per node. Duplicate
+        detection is left to the searches, which keep the fingerprints of expanded states.
+        A joint action id stands for one joint action, or for the steps of a tunnel macro.
+        Once a state is recorded it drops its parent pointer, so expanded states can be
+        garbage collected and plans are rebuilt by walking the parent indices.
+    """
+    def __init__(self, root: 'State'):
+        self.root = root
+        self.parents = array('q')
+        self.actions = array('l')
+        self.joint_actions = []  # joint action id -> list of the joint actions it stands for
+        self.joint_action_ids = {}  # tuple of tuples of actions -> joint action id
+
+    def add(self, state: 'State') -> int:
+        """
+            Records state, whose parent must already be recorded, and returns its node index.
+        """
+        if state.parent is None:
+            parent = -1
+        else:
+            parent = state.parent.node
+        if state.joint_action is None:
+            action_id = -1
+        else:
+            # steps of the joint action, several for states reached by a tunnel macro
+            steps = state.macro if state.macro is not None else [state.joint_action]
+            key = tuple(tuple(joint_action) for joint_action in steps)
+            action_id = self.joint_action_ids.get(key)
+            if action_id is None:
+                action_id = len(self.joint_actions)
+                self.joint_action_ids[key] = action_id
+                self.joint_actions.append(steps)
+        self.parents.append(parent)
+        self.actions.append(action_id)
+
+        node = len(self.parents) - 1
+        state.node = node
+        state.nodes = self
+        state.parent = None
+        return node
+
+    def size(self) -> int:
+        return len(self.parents)
+
+    def extract_plan(self, node: int) -> '[[Action, ...], ...]':
+        plan = []
+        while self.actions[node] != -1:
+            plan.extend(reversed(self.joint_actions[self.actions[node]]))
+            node = self.parents[node]
+        plan.reverse()
+        return plan
+
+    def extract_plan_with_locations(self, node: int):
+        # locations of agent '0' are replayed from the root, see State.extract_plan_with_locations
+        plan = self.extract_plan(node)
+        locations = []
+        agent = self.root.agents_map['0']
+        row, col = agent.row, agent.col
+        for joint_action in plan:
+            row += joint_action[0].agent_row_delta
+            col += joint_action[0].agent_col_delta
+            locations.append((row, col))
+        return plan, locations
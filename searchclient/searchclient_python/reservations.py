@@ -0,0 +1,44 @@
+from math import inf
+
+
+class ReservationTable:
+    """
+        Cells blocked over intervals of time steps, shared by the states of a search.
+        Open-ended reservations (cells of solved goals) and single time steps (cells on the
+        paths of agents that already have a plan) are kept apart, so is_free is O(1).
+    """
+    def __init__(self):
+        self.blocked_from = {}  # cell -> time step from which the cell is blocked for good
+        self.blocked_at = set()  # (cell, time step) blocked for that step only
+
+    def reserve(self, cell: tuple[int, int], start: int, end: float = inf):
+        """
+            Blocks cell for the time steps start <= t < end.
+        """
+        if end == inf:
+            self.blocked_from[cell] = min(start, self.blocked_from.get(cell, inf))
+        else:
+            for t in range(start, end):
+                self.blocked_at.add((cell, t))
+
+    def reserve_path(self, locations: list[tuple[int, int]], start: int):
+        """
+            Blocks the cells of a plan whose first location is reached at time step start + 1.
+            is_free is asked at time t about the cell an action moves into, which is held at
+            t + 1. No other path may hold it at t (it must be empty when the action starts),
+            t + 1 or t + 2 (the next action starts there), so a cell held at time t is blocked
+            for the steps t - 2 to t.
+        """
+        for t, cell in enumerate(locations, start + 1):
+            self.reserve(cell, t - 2, t + 1)
+
+    def clear_paths(self):
+        self.blocked_at.clear()
+
+    def is_free(self, cell: tuple[int, int], t: int) -> bool:
+        if self.blocked_from.get(cell, inf) <= t:
+            return False
+        return (cell, t) not in self.blocked_at
+
+    def __len__(self):
+        return len(self.blocked_from) + len(self.blocked_at)
@@ -6,18 +6,22 @@ import copy
 import cProfile
 
 import memory
+import external
 from color import Color
 from ct import CBS
 from state import State
-from frontier import FrontierBFS, FrontierDFS, FrontierBestFirst
-from heuristic import HeuristicAStar #, HeuristicWeightedAStar, HeuristicGreedy
+from level import Level
+from config import Config
+from frontier import FrontierBFS, FrontierDFS, FrontierBestFirst, FrontierBucket, FrontierMultiQueue
+from heuristic import HeuristicAStar, HeuristicWeightedAStar, HeuristicGreedy, HeuristicBoxProgress
 from graphsearch import search
+from algorithms import fullsearch
 from entities import Agent, Box, Goal
 
 
 class SearchClient:
     @staticmethod
-    def parse_level(server_messages) -> 'State':
+    def parse_level(server_messages, config: 'Config' = None) -> 'State':
         # We can assume that the level file is conforming to specification, since the server verifies this.
         # Read domain.
         server_messages.readline() # #domain
@@ -25,7 +29,7 @@ class SearchClient:
         
         # Read Level name.
         server_messages.readline() # #levelname
-        server_messages.readline() # <name>
+        name = server_messages.readline().strip() # <name>
         
         # Read colors.
         server_messages.readline() # #colors
@@ -56,20 +60,14 @@ class SearchClient:
         walls = [[False for _ in range(num_cols)] for _ in range(num_rows)]
         boxes = [['' for _ in range(num_cols)] for _ in range(num_rows)]
         
-        cells = {}
         agents_map = {}
         boxes_map = {}
-        cell_id = 0
         box_id = 0
         row = 0
         initial_agents_locs = {}
         for line in level_lines:
             for col, c in enumerate(line):
-                # cells
                 if c != '+' and row > 0 and row < len(level_lines) - 1:
-                    cells[cell_id] = (row, col)
-                    cell_id += 1 
-                
                     # agents
                     if '0' <= c <= '9':
                         agent = Agent(type=c, color=colors[c], row=row, col=col)
@@ -94,11 +92,9 @@ class SearchClient:
         goals = [['' for _ in range(num_cols)] for _ in range(num_rows)]
         line = server_messages.readline()
         row = 0
-        agents_only = False
         while not line.startswith('#'):
             for col, c in enumerate(line):
                 if '0' <= c <= '9': # agent goal
-                    agents_only = True
                     goal = Goal(id=goal_id, type=c, row=row, col=col)
                     goals_map[goal_id] = goal
                     goal_id += 1
@@ -118,52 +114,28 @@ class SearchClient:
         # End.
         # line is currently "#end".
 
-        # These are fixed for all states
-        State.num_rows = num_rows
-        State.num_cols = num_cols
-        State.cells = cells
-        State.neighbors = SearchClient.get_cells_neighbors(num_rows, num_cols, cells)
-        State.walls = walls
-        State.colors = colors
-        State.goals = goals
-        State.agents_only = agents_only
-        State.num_agents = len(agents_map)
-        State.num_boxes = len(boxes_map)
-        State.num_goals = len(goals_map)
-        State.initial_agents_locs = initial_agents_locs
-        State.manhattan = {}
-        
-        # These are instantiated every time a new state is created
-        State.agents_map = agents_map
-        State.boxes_map = boxes_map
-        State.goals_map = goals_map
+        # Static data, shared by all states
+        level = Level(name, walls, colors, goals, goals_map, initial_agents_locs, [box.type for box in boxes_map.values()], config)
 
-        return State(boxes, agents_map, boxes_map)
+        return State(level, boxes, agents_map, boxes_map)
 
+    
     @staticmethod
-    def get_cells_neighbors(num_rows, num_cols, cells):
-        neighbors = {cell_id: [] for cell_id in cells.keys()}
-
-        for cell_id, (row, col) in cells.items():
-            # Define the possible directions of neighbors: up, down, left, and right
-            directions = [(row - 1, col), (row + 1, col), (row, col - 1), (row, col + 1)]
-
-            for neighbor_row, neighbor_col in directions:
-                # Check if the neighboring cell is within the bounds of the grid
-                if 0 <= neighbor_row < num_rows and 0 <= neighbor_col < num_cols:
-                    # Find the cell ID of the neighboring cell
-                    for id, (r, c) in cells.items():
-                        if (r, c) == (neighbor_row, neighbor_col):
-                            neighbors[cell_id].append(id)
-                            break
-        return neighbors
+    def get_anytime_weights(w: 'float') -> 'list':
+        # Weights for ARA*, the distance to 1 is halved every round.
+        weights = [w]
+        while weights[-1] > 1.1:
+            weights.append(round(1 + (weights[-1] - 1) / 2, 2))
+        if weights[-1] != 1:
+            weights.append(1)
+        return weights
 
-    
     @staticmethod
-    def print_search_status(start_time: 'int', explored: '{State, ...}', frontier: 'Frontier') -> None:
-        status_template = '#Expanded: {:8,}, #Frontier: {:8,}, #Generated: {:8,}, Time: {:3.3f} s\n[Alloc: {:4.2f} MB, MaxAlloc: {:4.2f} MB]'
-        elapsed_time = time.perf_counter() - start_time
-        print(status_template.format(len(explored), frontier.size(), len(explored) + frontier.size(), elapsed_time, memory.get_usage(), memory.max_usage), file=sys.stderr, flush=True)
+    def get_best_first(heuristic: 'Heuristic', buckets: 'str' = None) -> 'Frontier':
+        # buckets is the order within the buckets of FrontierBucket ('lifo' or 'fifo'), None for a heap
+        if buckets is None:
+            return FrontierBestFirst(heuristic)
+        return FrontierBucket(heuristic, lifo=buckets == 'lifo')
 
     @staticmethod
     def main(args) -> None:
@@ -182,25 +154,62 @@ class SearchClient:
         server_messages = sys.stdin
         if hasattr(server_messages, "reconfigure"):
             server_messages.reconfigure(encoding='ASCII')
-        initial_state = SearchClient.parse_level(server_messages)
+        config = Config(
+            lazy_expansion=args.lazy,
+            tunnel_macros=args.tunnels,
+            reserve_paths=args.reserve_paths,
+            push_level=args.push_level,
+            reopen_closed=args.reopen,
+            external=args.external is not False,
+            external_dir=args.external or None,
+            h_cache=args.h_cache,
+            distance_cache=args.distance_cache,
+            max_memory=args.max_memory,
+        )
+        if config.external and external.np is None:
+            print('External search needs NumPy, searching in memory instead.', file=sys.stderr, flush=True)
+        initial_state = SearchClient.parse_level(server_messages, config)
         
         # Select search strategy.
+        if args.od and args.buckets is None:
+            # the whole level has wide plateaus of equal f, LIFO buckets search them deepest first
+            args.buckets = 'lifo'
         frontier = None
+        weights = None
         if args.bfs:
             frontier = FrontierBFS()
         elif args.dfs:
             frontier = FrontierDFS()
         elif args.astar:
-            frontier = FrontierBestFirst(HeuristicAStar(initial_state))
+            frontier = SearchClient.get_best_first(HeuristicAStar(initial_state), args.buckets)
+        elif args.wastar is not False:
+            frontier = SearchClient.get_best_first(HeuristicWeightedAStar(initial_state, args.wastar), args.buckets)
+        elif args.greedy:
+            frontier = SearchClient.get_best_first(HeuristicGreedy(initial_state), args.buckets)
+        elif args.arastar is not False:
+            frontier = SearchClient.get_best_first(HeuristicAStar(initial_state), args.buckets)
+            weights = SearchClient.get_anytime_weights(args.arastar)
+        elif args.multi:
+            frontier = FrontierMultiQueue([HeuristicGreedy(initial_state), HeuristicBoxProgress(initial_state)], preferred_boost=args.boost)
         else:
             # Default to BFS search.
             frontier = FrontierBFS()
-            print('Defaulting to BFS search. Use arguments -bfs, -dfs, -astar, -wastar, or -greedy to set the search strategy.', file=sys.stderr, flush=True)
+            print('Defaulting to BFS search. Use arguments -bfs, -dfs, -astar, -wastar, -greedy, -arastar or -multi to set the search strategy.', file=sys.stderr, flush=True)
         
         # Search for a plan.
-        print('Starting {}.'.format(frontier.get_name()), file=sys.stderr, flush=True)
-        plan = search(initial_state, frontier)
+        if weights is not None:
+            print('Starting ARA* with weights {}.'.format(weights), file=sys.stderr, flush=True)
+        else:
+            print('Starting {}.'.format(frontier.get_name()), file=sys.stderr, flush=True)
+        if args.od:
+            plan = fullsearch(initial_state, frontier, config)
+        else:
+            plan = search(initial_state, frontier, config, weights, args.anytime_limit)
         
+        search_heuristic = getattr(frontier, 'heuristic', None)
+        if isinstance(search_heuristic, HeuristicAStar) and search_heuristic.cache is not None:
+            print(search_heuristic.get_cache_status(), file=sys.stderr, flush=True)
+
         # Print plan to server.
         if plan is None:
             print('Unable to solve level.', file=sys.stderr, flush=True)
@@ -217,6 +226,18 @@ if __name__ == '__main__':
     # Program arguments.
     parser = argparse.ArgumentParser(description='Simple client based on state-space graph search.')
     parser.add_argument('--max-memory', metavar='<MB>', type=float, default=2048.0, help='The maximum memory usage allowed in MB (soft limit, default 2048).')
+    parser.add_argument('--od', action='store_true', dest='od', help='Search the whole level at once, expanding one agent at a time (operator decomposition). Needs a best-first strategy, which uses LIFO buckets unless --buckets is given.')
+    parser.add_argument('--reserve-paths', action='store_true', dest='reserve_paths', help='Make later goals plan around the paths of agents that already have a plan (experimental).')
+    parser.add_argument('--push-level', action='store_true', dest='push_level', help='Search box subproblems over pushes and pulls, walking the agent to them in between.')
+    parser.add_argument('--tunnels', action='store_true', dest='tunnels', help='Push or pull boxes through one-wide corridors in a single search step.')
+    parser.add_argument('--reopen', action='store_true', dest='reopen', help='Expand states again when a cheaper path to them is found after they were expanded.')
+    parser.add_argument('--lazy', action='store_true', dest='lazy', help='Only build child states when they are popped from the frontier.')
+    parser.add_argument('--anytime-limit', metavar='<s>', type=float, default=10.0, dest='anytime_limit', help='Seconds ARA* may spend improving the plan of a subproblem (default 10).')
+    parser.add_argument('--boost', metavar='<N>', type=int, default=1000, dest='boost', help='Pops the preferred queue of -multi gets whenever the search makes progress (default 1000).')
+    parser.add_argument('--h-cache', metavar='<N>', nargs='?', type=int, default=0, const=10000, dest='h_cache', help='Cache heuristic values, keeping at most N of them (10000 if N is not given).')
+    parser.add_argument('--buckets', metavar='lifo|fifo', nargs='?', choices=('lifo', 'fifo'), default=None, const='lifo', dest='buckets', help='Keep the open list of best-first strategies in buckets by f and h instead of a heap, in LIFO (default) or FIFO order within a bucket.')
+    parser.add_argument('--external', metavar='<dir>', nargs='?', type=str, default=False, const=None, dest='external', help='Search subproblems with external A*, keeping the states on disk in a temporary directory (under <dir> if given).')
+    parser.add_argument('--distance-cache', metavar='<dir>', type=str, default=None, dest='distance_cache', help='Cache the distance tables of levels in this directory and reuse them in later runs.')
     
     strategy_group = parser.add_mutually_exclusive_group()
     strategy_group.add_argument('-bfs', action='store_true', dest='bfs', help='Use the BFS strategy.')
@@ -224,11 +245,16 @@ if __name__ == '__main__':
     strategy_group.add_argument('-astar', action='store_true', dest='astar', help='Use the A* strategy.')
     strategy_group.add_argument('-wastar', action='store', dest='wastar', nargs='?', type=int, default=False, const=5, help='Use the WA* strategy.')
     strategy_group.add_argument('-greedy', action='store_true', dest='greedy', help='Use the Greedy strategy.')
+    strategy_group.add_argument('-arastar', action='store', dest='arastar', nargs='?', type=float, default=False, const=5, help='Use the ARA* strategy, starting from the given weight.')
+    strategy_group.add_argument('-multi', action='store_true', dest='multi', help='Use greedy search alternating between goal distance, box progress and preferred action queues.')
     
     args = parser.parse_args()
-    
-    # Set max memory usage allowed (soft limit).
-    memory.max_usage = args.max_memory
+    if args.od and not (args.astar or args.wastar is not False or args.greedy or args.arastar is not False or args.multi):
+        # without a heuristic the intermediate states are expanded right away, into every joint action
+        parser.error('--od needs a best-first strategy (-astar, -wastar, -greedy, -arastar or -multi).')
+    if args.lazy and args.tunnels:
+        # a handle is hashed by the one step it stands for, following a tunnel needs the child built
+        parser.error('--tunnels cannot be combined with --lazy.')
     
     # Run client.
     SearchClient.main(args)
@@ -1,113 +1,178 @@
 import random
 from action import Action, ActionType
-import copy
+from entities import Agent, Box
+from reservations import ReservationTable
 import sys
+# Moves, pushes and pulls by (type, agent row delta, agent col delta, box row delta, box col delta)
+TUNNEL_ACTIONS = {
+    (action.type, action.agent_row_delta, action.agent_col_delta, action.box_row_delta, action.box_col_delta): action
+    for action in Action if action.type is not ActionType.NoOp
+}
+
 class State:
     _RNG = random.Random(1)
+    # Cells of boxes a reduced state leaves out, see substate.get_reduced_state.
+    obstacles = frozenset()
     
     def __init__(
         self,
+        level,
         boxes,
         agents_map,
         boxes_map,
+        agent_positions=None,
+        reservations=None,
     ):
         """
-            Initial state parameters from level parser (fixed for all states):
-
-            self.walls = walls
-            self.colors = colors
-            self.goals = goals
-            self.num_agents = len(agents_map)
-            self.num_boxes = len(boxes_map)
-            self.num_goals = len(goals_map)
+            Static data (walls, colors, cells, ...) and the settings of the run (level.config) are
+            read from level, which is shared by all states of a level. The goals default to those
+            of the level, reduced states replace them.
         """
+        self.level = level
         self.boxes = boxes
         self.agents_map = agents_map
         self.boxes_map = boxes_map
-        self.marked = {}
+        self.goals_map = level.goals_map
+        self.goals = level.goals
+        self.agents_only = level.agents_only
+        self.num_agents = len(agents_map)
+        self.num_boxes = len(boxes_map)
+        self.num_goals = len(self.goals_map)
+        # cells blocked by solved goals and planned agents, shared with all states of a search
+        if reservations is None:
+            reservations = ReservationTable()
+        self.reservations = reservations
+        # (row, col) -> agent type of the agent standing there
+        if agent_positions is None:
+            agent_positions = State.get_agent_positions(agents_map)
+        self.agent_positions = agent_positions
         
         # other parameters
         self.parent = None
         self.joint_action = None
         self.g = 0
         self._hash = None
+        # matching cost per box type, set by HeuristicAStar
+        self.h_costs = None
+        # index of this state in the NodeStore that recorded it
+        self.node = None
+        self.nodes = None
+        # joint actions from the parent when reached by a tunnel macro, see follow_tunnel
+        self.macro = None
 
 
     
-    def result(self, joint_action: '[Action, ...]') -> 'State':
+    def get_changes(self, joint_action: '[Action, ...]', origin: 'tuple[int, int]' = None) -> 'tuple':
         '''
-        Returns the state resulting from applying joint_action in this state.
+        Returns what applying joint_action in this state changes, without building the child:
+        the moved agents as (agent, old agent, new row, new col), the moved boxes as
+        (box id, old box, new row, new col) and the Zobrist hash of the child.
+        With origin set, agent 0 first walks to origin and acts from there (push-level search).
         Precondition: Joint action must be applicable and non-conflicting in this state.
         '''
-        
-        # Copy this state.
-        boxes = [row[:] for row in self.boxes]
-        
-        # Apply each action.
-        agents_map = copy.deepcopy(self.agents_map)
-        boxes_map = copy.deepcopy(self.boxes_map)
-        goals_map = copy.deepcopy(self.goals_map)
-        goals = self.goals
+        agent_moves = []
+        box_moves = []
+        zobrist = self.level.zobrist
+        _hash = self.__hash__()
         for agent, action in enumerate(joint_action):
-            agent = str(agent)
             if action.type is ActionType.NoOp:
-                pass
-            
-            elif action.type is ActionType.Move:
-                agents_map[agent].row += action.agent_row_delta
-                agents_map[agent].col += action.agent_col_delta
+                continue
+            agent = str(agent)
+            old_agent = self.agents_map[agent]
+            if origin is not None and agent == '0':
+                origin_row, origin_col = origin
+            else:
+                origin_row, origin_col = old_agent.row, old_agent.col
+            agent_row = origin_row + action.agent_row_delta
+            agent_col = origin_col + action.agent_col_delta
+            agent_moves.append((agent, old_agent, agent_row, agent_col))
+            _hash ^= zobrist[agent][old_agent.row][old_agent.col]
+            _hash ^= zobrist[agent][agent_row][agent_col]
+
+            if action.type is ActionType.Move:
+                continue
             
             elif action.type is ActionType.Push:
-                agents_map[agent].row += action.agent_row_delta
-                agents_map[agent].col += action.agent_col_delta
-                
-                box_id = boxes[agents_map[agent].row][agents_map[agent].col]
-                box = boxes_map[box_id]
+                box_original_row = agent_row
+                box_original_col = agent_col
+                box_row = agent_row + action.box_row_delta
+                box_col = agent_col + action.box_col_delta
+        
+            elif action.type is ActionType.Pull:
+                box_original_row = origin_row - action.box_row_delta
+                box_original_col = origin_col - action.box_col_delta
+                box_row = origin_row
+                box_col = origin_col
 
-                # update old box cell
-                boxes[box.row][box.col] = ''
+            box_id = self.boxes[box_original_row][box_original_col]
+            old_box = self.boxes_map[box_id]
+            box_moves.append((box_id, old_box, box_row, box_col))
+            _hash ^= zobrist[old_box.type][box_original_row][box_original_col]
+            _hash ^= zobrist[old_box.type][box_row][box_col]
+        return agent_moves, box_moves, _hash
 
-                box.row = agents_map[agent].row + action.box_row_delta
-                box.col = agents_map[agent].col + action.box_col_delta
-                
-                # update new box cell
-                boxes[box.row][box.col] = box_id
+    def result(self, joint_action: '[Action, ...]', changes: 'tuple' = None) -> 'State':
+        '''
+        Returns the state resulting from applying joint_action in this state.
+        Precondition: Joint action must be applicable and non-conflicting in this state.
+        The child shares everything it does not change with this state: only the rows of
+        boxes and the agent and box records touched by joint_action are copied, so states
+        reached by search must never be modified in place.
+        changes can be passed when get_changes was already called for joint_action.
+        '''
+        if changes is None:
+            changes = self.get_changes(joint_action)
+        agent_moves, box_moves, _hash = changes
         
-            elif action.type is ActionType.Pull:
-                box_original_row = agents_map[agent].row - action.box_row_delta
-                box_original_col = agents_map[agent].col - action.box_col_delta
+        # Shallow copies, rows and entities are copied on write.
+        boxes = self.boxes[:]
+        copied_rows = set()
+        agents_map = self.agents_map.copy()
+        agent_positions = self.agent_positions.copy()
+        boxes_map = self.boxes_map.copy()
+        goals_map = self.goals_map
+        goals = self.goals
 
-                box_id = boxes[box_original_row][box_original_col]
-                box = boxes_map[box_id]
-                box.row = agents_map[agent].row
-                box.col = agents_map[agent].col
-                
-                # update old box cell
-                boxes[box_original_row][box_original_col] = ''
-                # update new box cell
-                boxes[box.row][box.col] = box_id
+        def copy_row(row):
+            if row not in copied_rows:
+                boxes[row] = boxes[row][:]
+                copied_rows.add(row)
 
-                agents_map[agent].row += action.agent_row_delta
-                agents_map[agent].col += action.agent_col_delta
+        for agent, old_agent, agent_row, agent_col in agent_moves:
+            new_agent = Agent(type=old_agent.type, color=old_agent.color, row=agent_row, col=agent_col)
+            agents_map[agent] = new_agent
+            # the old cell may already belong to an agent that moved in earlier in this joint action
+            if agent_positions.get((old_agent.row, old_agent.col)) == new_agent.type:
+                del agent_positions[(old_agent.row, old_agent.col)]
+            agent_positions[(agent_row, agent_col)] = new_agent.type
 
-            
-        copy_state = State(boxes, agents_map, boxes_map)
+        # clear all old box cells first, a box may move into a cell another box just left
+        for box_id, old_box, box_row, box_col in box_moves:
+            copy_row(old_box.row)
+            boxes[old_box.row][old_box.col] = ''
+        for box_id, old_box, box_row, box_col in box_moves:
+            boxes_map[box_id] = Box(id=old_box.id, color=old_box.color, row=box_row, col=box_col, type=old_box.type)
+            copy_row(box_row)
+            boxes[box_row][box_col] = box_id
+
+        copy_state = State(self.level, boxes, agents_map, boxes_map, agent_positions=agent_positions, reservations=self.reservations)
         copy_state.parent = self
         copy_state.joint_action = joint_action[:]
         copy_state.g = self.g + 1
         copy_state.goals_map = goals_map
         copy_state.goals = goals
-        copy_state.num_agents = len(agents_map)
         copy_state.num_goals = len(goals_map)
-        copy_state.num_boxes = len(boxes_map)
-        copy_state.marked = self.marked
         copy_state.agents_only = self.agents_only
+        copy_state._hash = _hash
 
         return copy_state
+
+    def materialize(self) -> 'State':
+        return self
     
     def is_goal_state(self) -> 'bool':
-        for idx, goal in State.goals_map.items():
-            if State.agents_only: # agents-only levels
+        for idx, goal in self.goals_map.items():
+            if goal.type.isdigit(): # agent goal
                 agent = self.agents_map[goal.type]
                 if agent.row != goal.row or agent.col != goal.col:
                     return False
@@ -137,9 +202,18 @@ class State:
                         return False
             return True
         
-    def get_expanded_states(self) -> '[State, ...]':
+    def get_expanded_states(self, lazy: 'bool' = False, decomposed: 'bool' = False) -> '[State, ...]':
+        '''
+        Returns the children of this state in random order.
+        With lazy=True the children are StateHandles, see StateHandle, and tunnels are not followed.
+        With decomposed=True agents are assigned one at a time, see get_decomposed_states, and
+        lazy only applies to the children that complete a joint action.
+        '''
+        if decomposed and self.num_agents > 1:
+            return self.get_decomposed_states(lazy=lazy)
+
         # Determine list of applicable action for each individual agent.
-        applicable_actions = [[action for action in Action if self.is_applicable(agent, action)] for agent in range(self.num_agents)]
+        applicable_actions = [self.get_applicable_actions(agent) for agent in range(self.num_agents)]
         # Iterate over joint actions, check conflict and generate child states.
     
         joint_action = [None for _ in range(self.num_agents)]
@@ -150,7 +224,13 @@ class State:
                 joint_action[agent] = applicable_actions[agent][actions_permutation[agent]]
                 
             if not self.is_conflicting(joint_action):
-                expanded_states.append(self.result(joint_action))
+                if lazy:
+                    expanded_states.append(StateHandle(self, joint_action[:]))
+                else:
+                    child = self.result(joint_action)
+                    if self.level.config.tunnel_macros and self.num_agents == 1:
+                        child = child.follow_tunnel()
+                    expanded_states.append(child)
             
             # Advance permutation.
             done = False
@@ -170,6 +250,147 @@ class State:
         State._RNG.shuffle(expanded_states)
         return expanded_states
     
+    def follow_tunnel(self) -> 'State':
+        '''
+        Tunnel macro for a state reached by an action of agent 0 into a tunnel (see
+        Level.get_tunnels): in a one-wide corridor the only other choice is to go back, so
+        the action is repeated along it. A pushed or pulled box is moved on while it and the
+        agent are both in the tunnel, a move goes on while the agent is in the tunnel and has
+        no box next to it. Either stops on a goal cell. Returns the state at the end, reached
+        from the parent of this state in one step whose primitive joint actions are in macro,
+        or self if there is nothing to follow.
+        '''
+        action = self.joint_action[0]
+        if action.type is ActionType.NoOp:
+            return self
+        level = self.level
+        cell_ids = level.cell_ids
+        tunnels = level.tunnels
+        state = self
+        steps = [self.joint_action]
+        while True:
+            agent = state.agents_map['0']
+            agent_cell = cell_ids[agent.row][agent.col]
+            if agent_cell not in tunnels:
+                break
+            if action.type is ActionType.Move:
+                if state.goals[agent.row][agent.col] != '':
+                    break
+                previous_cell = cell_ids[agent.row - action.agent_row_delta][agent.col - action.agent_col_delta]
+                if any(state.boxes[row][col] != '' for row, col in (level.cells[cell] for cell in level.neighbors[agent_cell])):
+                    break
+                next_row, next_col = [level.cells[cell] for cell in level.neighbors[agent_cell] if cell != previous_cell][0]
+                next_action = TUNNEL_ACTIONS[(ActionType.Move, next_row - agent.row, next_col - agent.col, 0, 0)]
+            else:
+                if action.type is ActionType.Push:
+                    box_row, box_col = agent.row + action.box_row_delta, agent.col + action.box_col_delta
+                else:
+                    box_row, box_col = agent.row - action.agent_row_delta, agent.col - action.agent_col_delta
+                box_cell = cell_ids[box_row][box_col]
+                if box_cell not in tunnels or state.goals[box_row][box_col] != '':
+                    break
+                if action.type is ActionType.Push:
+                    # the box goes on to its other neighbour, the agent follows into its cell
+                    next_row, next_col = [level.cells[cell] for cell in level.neighbors[box_cell] if cell != agent_cell][0]
+                    next_action = TUNNEL_ACTIONS[(ActionType.Push, box_row - agent.row, box_col - agent.col, next_row - box_row, next_col - box_col)]
+                else:
+                    # the agent goes on to its other neighbour, the box follows into its cell
+                    next_row, next_col = [level.cells[cell] for cell in level.neighbors[agent_cell] if cell != box_cell][0]
+                    next_action = TUNNEL_ACTIONS[(ActionType.Pull, next_row - agent.row, next_col - agent.col, agent.row - box_row, agent.col - box_col)]
+            if not state.is_applicable(0, next_action):
+                break
+            state = state.result([next_action])
+            steps.append([next_action])
+            action = next_action
+        if state is self:
+            return self
+        state.parent = self.parent
+        state.macro = steps
+        return state
+
+    def get_applicable_actions(self, agent: 'int') -> '[Action, ...]':
+        '''
+        Applicable actions of agent, in Action order. Wall checks and destination cells come from
+        the action table of the level, so only the occupancy of those cells is checked here.
+        Boxes are never moved into the dead cells of their type, see Level.get_dead_cells.
+        '''
+        agent = self.agents_map[str(agent)]
+        applicable_actions = [Action.NoOp]
+        level = self.level
+        dead_cells = level.dead_cells
+        for action, agent_destination, box_location, box_destination in level.action_table[level.cell_ids[agent.row][agent.col]]:
+            if action.type is ActionType.Move:
+                if self.is_vacant(*agent_destination):
+                    applicable_actions.append(action)
+                continue
+            box_id = self.boxes[box_location[0]][box_location[1]]
+            if box_id == '':
+                continue
+            box = self.boxes_map[box_id]
+            if box.color != agent.color or box_destination in dead_cells.get(box.type, ()):
+                continue
+            if action.type is ActionType.Push:
+                if self.is_vacant(*box_destination):
+                    applicable_actions.append(action)
+            elif self.is_vacant(*agent_destination):
+                applicable_actions.append(action)
+        return applicable_actions
+
+    def get_decomposed_states(self, pending: 'tuple' = (), lazy: 'bool' = False) -> '[State, ...]':
+        '''
+        Operator decomposition: pending holds the actions already chosen for the first agents,
+        the children choose an action for the next agent only. Children with actions left to
+        choose are PartialStates, the last agent's choice applies the full joint action.
+        Actions conflicting with the pending ones are pruned right away, so the branching
+        factor is that of a single agent. An agent left with a single action gets no node of
+        its own, the action is added to pending and the next agent chooses.
+        '''
+        agent = len(pending)
+        actions = [action for action in self.get_applicable_actions(agent) if not self.is_conflicting_with(pending, agent, action)]
+        while len(actions) == 1 and agent < self.num_agents - 1:
+            pending += (actions[0],)
+            agent += 1
+            actions = [action for action in self.get_applicable_actions(agent) if not self.is_conflicting_with(pending, agent, action)]
+        expanded_states = []
+        for action in actions:
+            joint_action = pending + (action,)
+            if len(joint_action) == self.num_agents:
+                if lazy:
+                    expanded_states.append(StateHandle(self, list(joint_action)))
+                    continue
+                expanded_states.append(self.result(list(joint_action)))
+            else:
+                expanded_states.append(PartialState(self, joint_action))
+        State._RNG.shuffle(expanded_states)
+        return expanded_states
+
+    def is_conflicting_with(self, pending: 'tuple', agent: 'int', action: 'Action') -> 'bool':
+        ''' Whether action of agent conflicts with the actions pending for agents 0, ..., agent - 1. '''
+        if action.type is ActionType.NoOp:
+            return False
+        destinations, moved_box = self.get_action_cells(agent, action)
+        for other, other_action in enumerate(pending):
+            if other_action.type is ActionType.NoOp:
+                continue
+            other_destinations, other_moved_box = self.get_action_cells(other, other_action)
+            if not destinations.isdisjoint(other_destinations):
+                return True
+            if moved_box is not None and moved_box == other_moved_box:
+                return True
+        return False
+
+    def get_action_cells(self, agent: 'int', action: 'Action') -> 'tuple':
+        ''' Cells occupied by agent and box after action, and the cell of the box it moves (or None). '''
+        agent = self.agents_map[str(agent)]
+        agent_destination = (agent.row + action.agent_row_delta, agent.col + action.agent_col_delta)
+        if action.type is ActionType.Push:
+            box_destination = (agent_destination[0] + action.box_row_delta, agent_destination[1] + action.box_col_delta)
+            return {agent_destination, box_destination}, agent_destination
+        elif action.type is ActionType.Pull:
+            box_location = (agent.row - action.box_row_delta, agent.col - action.box_col_delta)
+            return {agent_destination, (agent.row, agent.col)}, box_location
+        return {agent_destination}, None
+
     def is_applicable(self, agent: 'int', action: 'Action') -> 'bool':
         agent_row = self.agents_map[str(agent)].row
         agent_col = self.agents_map[str(agent)].col
@@ -188,10 +409,12 @@ class State:
             agent_destination_col = agent_col + action.agent_col_delta
 
             if self.boxes[agent_destination_row][agent_destination_col] != '':
-                box_color = self.boxes_map[self.boxes[agent_destination_row][agent_destination_col]].color
-                if box_color == agent_color:
+                box = self.boxes_map[self.boxes[agent_destination_row][agent_destination_col]]
+                if box.color == agent_color:
                     box_destination_row = agent_destination_row + action.box_row_delta
                     box_destination_col = agent_destination_col + action.box_col_delta
+                    if self.is_dead_cell(box.type, box_destination_row, box_destination_col):
+                        return False
                     return self.is_free(box_destination_row, box_destination_col)            
             return False
         
@@ -202,8 +425,8 @@ class State:
             opposite_dir_col = agent_col - action.box_col_delta
 
             if self.is_free(agent_destination_row, agent_destination_col) and self.boxes[opposite_dir_row][opposite_dir_col] != '':
-                box_color = self.boxes_map[self.boxes[opposite_dir_row][opposite_dir_col]].color
-                if box_color == agent_color:
+                box = self.boxes_map[self.boxes[opposite_dir_row][opposite_dir_col]]
+                if box.color == agent_color and not self.is_dead_cell(box.type, agent_row, agent_col):
                     return self.is_free(agent_destination_row, agent_destination_col)
             return False
 
@@ -242,35 +465,71 @@ class State:
                         
         return False
     
-    def is_free(self, row: 'int', col: 'int') -> 'bool':
-        no_wall = not State.walls[row][col] 
+    def is_free(self, row: 'int', col: 'int', t: 'int' = None) -> 'bool':
+        ''' Whether an agent or box can move into the cell, t is the time step (defaults to g). '''
+        no_wall = not self.level.walls[row][col] 
+        return no_wall and self.is_vacant(row, col, t)
+
+    def is_vacant(self, row: 'int', col: 'int', t: 'int' = None) -> 'bool':
+        ''' Dynamic part of is_free, the cell must not be a wall. '''
         no_box = self.boxes[row][col] == ''
-        no_agent = self.agent_at(row, col) is None
-        no_marked = (row,col) not in self.marked
-        if not no_marked:
-            if self.marked[(row,col)] >= self.g: # only mark if its after solving goal
-                no_marked = True
-        return no_wall and no_box and no_agent and no_marked
+        no_agent = (row, col) not in self.agent_positions
+        no_reserved = self.reservations.is_free((row, col), self.g if t is None else t)
+        return no_box and no_agent and no_reserved
     
+    def is_dead_cell(self, box_type: 'str', row: 'int', col: 'int') -> 'bool':
+        ''' Whether a box of box_type can never reach one of its goals from the cell. '''
+        return (row, col) in self.level.dead_cells.get(box_type, ())
+
+    def update_indexes(self):
+        ''' Recomputes the agent index of a state that was modified in place. '''
+        self.agent_positions = State.get_agent_positions(self.agents_map)
+
+    @staticmethod
+    def get_agent_positions(agents_map) -> 'dict':
+        return {(agent.row, agent.col): agent.type for agent in agents_map.values()}
+
+    def get_agent_location(self, agent: 'str') -> 'tuple[int, int]':
+        return (self.agents_map[agent].row, self.agents_map[agent].col)
+
+    def get_box_location(self, box_id: 'int') -> 'tuple[int, int]':
+        return (self.boxes_map[box_id].row, self.boxes_map[box_id].col)
+
     def agent_at(self, row: 'int', col: 'int') -> 'char':
-        for idx, agent in self.agents_map.items():
-            if agent.row == row and agent.col == col:
-                return chr(int(agent.type) + ord('0'))
-        return None
+        return self.agent_positions.get((row, col))
     
     def extract_plan(self) -> '[Action, ...]':
+        if self.nodes is not None:
+            return self.nodes.extract_plan(self.node)
         plan = [None for _ in range(self.g)]
         state = self
         while state.joint_action is not None:
-            plan[state.g - 1] = state.joint_action
+            if state.macro is not None:
+                plan[state.g - len(state.macro):state.g] = state.macro
+            else:
+                plan[state.g - 1] = state.joint_action
             state = state.parent
         return plan
     
     def extract_plan_with_locations(self):
+        if self.nodes is not None:
+            return self.nodes.extract_plan_with_locations(self.node)
         plan = []
         locations = []
         state = self
         while state.joint_action is not None:
+            if state.macro is not None:
+                # replay the macro from the parent, its intermediate states are not kept
+                row, col = state.parent.get_agent_location('0')
+                macro_locations = []
+                for joint_action in state.macro:
+                    row += joint_action[0].agent_row_delta
+                    col += joint_action[0].agent_col_delta
+                    macro_locations.append((row, col))
+                plan.extend(reversed(state.macro))
+                locations.extend(reversed(macro_locations))
+                state = state.parent
+                continue
             plan.append(state.joint_action)
             # this function is only used by subgoal planner so it's safe to assume there's always only one agent
             locations.append((state.agents_map['0'].row, state.agents_map['0'].col))
@@ -280,32 +539,32 @@ class State:
         return plan, locations
         
     def __hash__(self):
+        # Zobrist hash: XOR of the keys of every agent and box at its cell.
+        # Computed in full only for root states, children get it incrementally from State.result.
         if self._hash is None:
-            prime = 31
-            _hash = 1
-            _hash = _hash * prime + hash(tuple((agent.color, agent.row, agent.col) for agent in self.agents_map.values()))
-            _hash = _hash * prime + hash(tuple(tuple(row) for row in self.boxes))
-            _hash = _hash * prime + hash(tuple(State.colors))
-            _hash = _hash * prime + hash(tuple(tuple(row) for row in State.goals))
-            _hash = _hash * prime + hash(tuple(tuple(row) for row in State.walls))
+            zobrist = self.level.zobrist
+            _hash = 0
+            for idx, agent in self.agents_map.items():
+                _hash ^= zobrist[idx][agent.row][agent.col]
+            for idx, box in self.boxes_map.items():
+                _hash ^= zobrist[box.type][box.row][box.col]
             self._hash = _hash
         return self._hash
     
     def __eq__(self, other):
+        # Only dynamic data is compared, walls, colors and goals are fixed during a search.
         if self is other:
             return True
+        if isinstance(other, StateHandle):
+            return other == self
         if not isinstance(other, State): 
             return False
-        if self.agents_map != other.agents_map: 
+        if self.__hash__() != other.__hash__():
             return False
-        if State.walls != other.walls: 
+        if self.agents_map != other.agents_map: 
             return False
         if self.boxes != other.boxes: 
             return False
-        if State.colors != other.colors: 
-            return False
-        if self.goals_map != other.goals_map: 
-            return False
         return True
     
     def __repr__(self):
@@ -314,8 +573,131 @@ class State:
             line = []
             for col in range(len(self.boxes[row])):
                 if self.boxes[row][col] != '': line.append(str(self.boxes[row][col]))
-                elif State.walls[row][col]: line.append('+')
-                elif self.agent_at(row, col) is not None: line.append(self.agent_at(row, col))
+                elif self.level.walls[row][col]: line.append('+')
+                elif (row, col) in self.agent_positions: line.append(self.agent_positions[(row, col)])
                 else: line.append(' ')
             lines.append(''.join(line))
         return '\n'.join(lines)
+
+
+class StateHandle:
+    '''
+    Child of parent reached by joint_action that has not been built yet, it only holds the
+    changes from State.get_changes. Handles hash and compare equal to the State they stand for,
+    so they can be checked against the frontier and explored set, and are built into a State
+    by materialize once they are popped from the frontier.
+    '''
+    __slots__ = ('parent', 'joint_action', 'changes', 'g', 'h_costs', '_hash', '_agents_map', '_boxes_map')
+
+    def __init__(self, parent: 'State', joint_action: '[Action, ...]'):
+        self.parent = parent
+        self.joint_action = joint_action
+        self.changes = parent.get_changes(joint_action)
+        self.g = parent.g + 1
+        self.h_costs = None
+        self._hash = self.changes[2]
+        self._agents_map = None
+        self._boxes_map = None
+
+    def materialize(self) -> 'State':
+        state = self.parent.result(self.joint_action, self.changes)
+        state.h_costs = self.h_costs
+        return state
+
+    # Read-only views used by the heuristics, built on first access.
+    @property
+    def agents_map(self) -> 'dict':
+        if self._agents_map is None:
+            self._agents_map = self.parent.agents_map.copy()
+            for agent, old_agent, row, col in self.changes[0]:
+                self._agents_map[agent] = Agent(type=old_agent.type, color=old_agent.color, row=row, col=col)
+        return self._agents_map
+
+    @property
+    def boxes_map(self) -> 'dict':
+        if self._boxes_map is None:
+            self._boxes_map = self.parent.boxes_map.copy()
+            for box_id, old_box, row, col in self.changes[1]:
+                self._boxes_map[box_id] = Box(id=old_box.id, color=old_box.color, row=row, col=col, type=old_box.type)
+        return self._boxes_map
+
+    @property
+    def level(self) -> 'Level':
+        return self.parent.level
+
+    @property
+    def goals_map(self) -> 'dict':
+        return self.parent.goals_map
+
+    @property
+    def agents_only(self) -> 'bool':
+        return self.parent.agents_only
+
+    def get_agent_location(self, agent: 'str') -> 'tuple[int, int]':
+        for moved, old_agent, row, col in self.changes[0]:
+            if moved == agent:
+                return (row, col)
+        return self.parent.get_agent_location(agent)
+
+    def get_box_location(self, box_id: 'int') -> 'tuple[int, int]':
+        for moved, old_box, row, col in self.changes[1]:
+            if moved == box_id:
+                return (row, col)
+        return self.parent.get_box_location(box_id)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, (State, StateHandle)):
+            return False
+        if self._hash != other.__hash__():
+            return False
+        for agent in self.parent.agents_map:
+            if self.get_agent_location(agent) != other.get_agent_location(agent):
+                return False
+        for box_id in self.parent.boxes_map:
+            if self.get_box_location(box_id) != other.get_box_location(box_id):
+                return False
+        return True
+
+
+class PartialState:
+    '''
+    Intermediate node of operator decomposition: state with the actions already chosen for the
+    first len(pending) agents in the next joint action. Everything else is read from state.
+    '''
+    __slots__ = ('state', 'pending', 'h', '_hash')
+
+    def __init__(self, state: 'State', pending: 'tuple'):
+        self.state = state
+        self.pending = pending
+        self.h = None # set by HeuristicAStar.get_partial_h
+        self._hash = hash((state.__hash__(), pending))
+
+    def __getattr__(self, name):
+        return getattr(self.state, name)
+
+    def materialize(self) -> 'PartialState':
+        return self
+
+    def is_goal_state(self) -> 'bool':
+        return False
+
+    def is_subgoal_state(self) -> 'bool':
+        return False
+
+    def get_expanded_states(self, lazy: 'bool' = False, decomposed: 'bool' = True) -> '[State, ...]':
+        return self.state.get_decomposed_states(self.pending, lazy)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if not isinstance(other, PartialState):
+            return False
+        return self.pending == other.pending and self.state == other.state
@@ -3,51 +3,45 @@ import copy
 import sys
 from entities import Box, Goal, Agent
 
-def update_state(state: State, match: dict, agent_locations: dict) -> State:
+def update_state(state: State, match: dict, agent_locations: dict, solved_at: int) -> State:
     state.agents_map[match["agent"].type].row = agent_locations[-1][0]
     state.agents_map[match["agent"].type].col = agent_locations[-1][1]
-    state.marked[(match["goal"].row, match["goal"].col)] = len(agent_locations)
+    # the goal cell is blocked from the time step the goal is solved at, counted from the start of the level
+    state.reservations.reserve((match["goal"].row, match["goal"].col), solved_at)
 
     if 'box' in match.keys():
         state.boxes[match["box"].row][match["box"].col] = ''
         state.boxes_map.pop(match["box"].id)
         state.num_boxes -= 1
+    state.update_indexes()
     return state
 
 
 
 def get_reduced_state(state: State, match: dict, g: int) -> State:
-    copied = copy.deepcopy(state)
-    copied.boxes = [['' for _ in range(state.num_cols)] for _ in range(state.num_rows)]
-    copied.boxes_map = {}
+    # Only the dynamic data is rebuilt, the level is shared with state
+    boxes = [['' for _ in range(state.level.num_cols)] for _ in range(state.level.num_rows)]
+    boxes_map = {}
 
     if 'box' in match.keys():
-        copied.boxes[match['box'].row][match['box'].col] = 0 # rename box to 0
-        copied.boxes_map = { 0: match['box'] } # rename box to 0
+        boxes[match['box'].row][match['box'].col] = 0 # rename box to 0
+        boxes_map = { 0: copy.copy(match['box']) } # rename box to 0
     
     # Rename agents to 0 for compatibility with existing state.py functions
-    agent = copy.deepcopy(match['agent'])
+    agent = copy.copy(match['agent'])
     agent.type = '0'
-    copied.agents_map = {'0': agent}
+    agents_map = {'0': agent}
 
     # Build new state
-    reduced_state = State(copied.boxes, copied.agents_map, copied.boxes_map)
-    reduced_state.goals = [['' for _ in range(state.num_cols)] for _ in range(state.num_rows)]
+    reduced_state = State(state.level, boxes, agents_map, boxes_map, reservations=copy.deepcopy(state.reservations))
+    reduced_state.goals = [['' for _ in range(state.level.num_cols)] for _ in range(state.level.num_rows)]
     reduced_state.goals[match['goal'].row][match['goal'].col] = match['goal'].type
     reduced_state.goals_map = { 0: match['goal'] }
-    
-    reduced_state.num_rows = copied.num_rows
-    reduced_state.num_cols = copied.num_cols
-    reduced_state.cells = copied.cells
-    reduced_state.neighbors = copied.neighbors
-    reduced_state.walls = copied.walls
-    reduced_state.colors = copied.colors
-    reduced_state.marked = copied.marked
-    
-    reduced_state.num_agents = 1
-    reduced_state.num_boxes = 1
     reduced_state.num_goals = 1
     reduced_state.agents_only = False if 'box' in match.keys() else True
+    if reduced_state.agents_only:
+        # the boxes are left out, bidirectional_subsearch walks around them
+        reduced_state.obstacles = frozenset((box.row, box.col) for box in state.boxes_map.values())
     reduced_state.g = g
 
     return reduced_state
@@ -58,9 +52,10 @@ def find_best_match(state: State, entity: Box | Goal, plans: dict) -> Agent | Bo
     if not hasattr(entity, 'color'): # if entity is a goal (goals don't have colors)
         min_distance = float('inf')
         if entity.type.isdigit(): # match agent to agent goal
+            best_agent = None
             for idx, agent in state.agents_map.items():
                 if agent.type == entity.type:
-                    distance = abs(agent.row - entity.row) + abs(agent.col - entity.col)
+                    distance = state.level.distance((agent.row, agent.col), (entity.row, entity.col))
                     if agent.type in plans.keys():
                         distance += len(plans[agent.type])
                     if distance < min_distance:
@@ -70,7 +65,7 @@ def find_best_match(state: State, entity: Box | Goal, plans: dict) -> Agent | Bo
         best_box = None
         for idx, box in state.boxes_map.items(): # match box to goal
             if box.type == entity.type:
-                distance = abs(box.row - entity.row) + abs(box.col - entity.col)
+                distance = state.level.distance((box.row, box.col), (entity.row, entity.col))
                 if distance < min_distance:
                     min_distance = distance
                     best_box = box
@@ -80,7 +75,7 @@ def find_best_match(state: State, entity: Box | Goal, plans: dict) -> Agent | Bo
         best_agent = None
         for idx, agent in state.agents_map.items():
             if agent.color == entity.color:
-                distance = abs(agent.row - entity.row) + abs(agent.col - entity.col)
+                distance = state.level.distance((agent.row, agent.col), (entity.row, entity.col))
                 if agent.type in plans.keys():
                     distance += len(plans[agent.type])
                 if distance < min_distance:
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# the client modules import each other by name, as when searchclient.py is run from its directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from state import State
+
+
+@pytest.fixture(autouse=True)
+def seed_expansion_order():
+    # expansions are shuffled with State._RNG, every test starts from its seed as a fresh client does
+    State._RNG.seed(1)
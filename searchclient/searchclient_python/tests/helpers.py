@@ -0,0 +1,29 @@
+import io
+import os
+
+from config import Config
+from graphsearch import is_valid_plan
+from searchclient import SearchClient
+
+LEVELS_DIRECTORY = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'levels')
+
+
+def load_level(name: 'str', config: 'Config' = None) -> 'State':
+    ''' Initial state of a level file in searchclient/levels. '''
+    with open(os.path.join(LEVELS_DIRECTORY, name)) as level_file:
+        return SearchClient.parse_level(io.StringIO(level_file.read()), config)
+
+
+def make_level(colors: 'list', initial: 'list', goal: 'list', config: 'Config' = None) -> 'State':
+    ''' Initial state of a level built from the lines of its #colors, #initial and #goal sections. '''
+    text = '\n'.join(['#domain', 'hospital', '#levelname', 'test', '#colors'] + colors + ['#initial'] + initial + ['#goal'] + goal + ['#end', ''])
+    return SearchClient.parse_level(io.StringIO(text), config)
+
+
+def is_solution(state: 'State', plan: 'list') -> 'bool':
+    ''' Whether plan is valid from state (see graphsearch.is_valid_plan) and ends in a goal state. '''
+    if plan is None or not is_valid_plan(state, plan):
+        return False
+    for joint_action in plan:
+        state = state.result(joint_action)
+    return state.is_goal_state()
@@ -0,0 +1,123 @@
+import algorithms
+from action import Action
+from algorithms import backtrack, backtrack_with_boxes, bidirectional_subsearch, noop, subsearch
+from config import Config
+from frontier import FrontierBestFirst
+from heuristic import HeuristicAStar
+from helpers import make_level
+from substate import get_reduced_state, match_goal
+
+INITIAL = [
+    '++++++',
+    '+0  2+',
+    '++1+++',
+    '++++++',
+]
+GOAL = [
+    '++++++',
+    '+12 0+',
+    '++ +++',
+    '++++++',
+]
+
+
+def test_backtrack_at_the_first_step_waits_until_the_leader_has_left():
+    level = make_level(['blue: 0, 1, 2'], INITIAL, GOAL).level
+    plans = {'0': [[Action.MoveE], [Action.MoveE], [Action.MoveE]], '1': [[Action.MoveN], [Action.MoveW]]}
+    locations = {'0': [(1, 2), (1, 3), (1, 4)], '1': [(1, 2), (1, 1)]}
+    plans, locations = backtrack('1', '0', 0, plans, locations, False, level)
+    # agent 0 is on (1, 2) at step 0 and leaves it at step 1, agent 1 cannot follow it in before step 2
+    assert plans['1'] == [[Action.NoOp], [Action.NoOp], [Action.MoveN], [Action.MoveW]]
+    assert locations['1'] == [(2, 2), (2, 2), (1, 2), (1, 1)]
+
+
+def test_backtrack_past_the_end_of_the_leader_plan():
+    level = make_level(['blue: 0, 1, 2'], INITIAL, GOAL).level
+    plans = {'0': [[Action.MoveE]], '2': [[Action.MoveW], [Action.MoveW]]}
+    locations = {'0': [(1, 2)], '2': [(1, 3), (1, 2)]}
+    # agent 0 stays on (1, 2) once its plan is done, agent 2 undoes its move towards it
+    plans, locations = backtrack('2', '0', 1, plans, locations, False, level)
+    assert plans['2'] == [[Action.MoveW], [Action.MoveE], [Action.NoOp], [Action.MoveW], [Action.MoveW]]
+    assert locations['2'] == [(1, 3), (1, 4), (1, 4), (1, 3), (1, 2)]
+
+
+def test_noop_waits_where_the_agent_starts():
+    level = make_level(['blue: 0, 1, 2'], INITIAL, GOAL).level
+    plans = {'2': [[Action.MoveW], [Action.MoveW]]}
+    locations = {'2': [(1, 3), (1, 2)]}
+    # the waits go before the first action, whatever step the conflict is at
+    plans, locations = noop('2', plans, locations, 2, 1, level)
+    assert plans['2'] == [[Action.NoOp], [Action.NoOp], [Action.MoveW], [Action.MoveW]]
+    assert locations['2'] == [(1, 4), (1, 4), (1, 3), (1, 2)]
+
+
+def test_backtrack_with_boxes_undoes_a_push_until_the_leader_has_passed():
+    level = make_level(['blue: 0, 1'], ['+++++++++', '+++0+++++', '+    1  +', '+++ +++++', '+++++++++'], ['+++++++++', '+++ +++++', '+1      +', '+++0+++++', '+++++++++']).level
+    # agent 1 pulls a box from (2, 4) and pushes it back onto (2, 3), where agent 0 crosses at step 2
+    plans = {'0': [[Action.NoOp], [Action.NoOp], [Action.MoveS], [Action.MoveS]], '1': [[Action.PullEE], [Action.PushWW], [Action.PushWW]]}
+    locations = {'0': [(1, 3), (1, 3), (2, 3), (3, 3)], '1': [(2, 6), (2, 5), (2, 4)]}
+    plans, locations = backtrack_with_boxes('1', '0', 2, plans, locations, False, level)
+    # the push is undone by a pull and done again once agent 0 has left (2, 3)
+    assert plans['1'] == [[Action.PullEE], [Action.PushWW], [Action.PullEE], [Action.NoOp], [Action.PushWW], [Action.PushWW]]
+    assert locations['1'] == [(2, 6), (2, 5), (2, 6), (2, 6), (2, 5), (2, 4)]
+
+
+NAVIGATION = (
+    ['blue: 0, A'],
+    [
+        '+++++++',
+        '+0    +',
+        '+++++ +',
+        '+     +',
+        '+++++++',
+    ],
+    [
+        '+++++++',
+        '+     +',
+        '+++++ +',
+        '+0    +',
+        '+++++++',
+    ],
+)
+BLOCKED = (
+    ['blue: 0, A'],
+    [
+        '+++++++',
+        '+0 A  +',
+        '+ +++ +',
+        '+     +',
+        '+++++++',
+    ],
+    [
+        '+++++++',
+        '+    0+',
+        '+ +++ +',
+        '+     +',
+        '+++++++',
+    ],
+)
+
+
+def get_navigation_state(level) -> 'State':
+    state = make_level(*level)
+    goal = next(goal for goal in state.goals_map.values() if goal.type.isdigit())
+    return get_reduced_state(state, match_goal(state, goal, {}), 0)
+
+
+def search_in_time(state, monkeypatch):
+    monkeypatch.setattr(algorithms, 'bidirectional_subsearch', lambda state: None)
+    return subsearch(state, FrontierBestFirst(HeuristicAStar(state)), Config())
+
+
+def test_bidirectional_subsearch_matches_the_search_in_time(monkeypatch):
+    # there is one shortest path and nothing on it, both searches must give it the same way
+    plan, locations = bidirectional_subsearch(get_navigation_state(NAVIGATION))
+    assert (plan, locations) == search_in_time(get_navigation_state(NAVIGATION), monkeypatch)
+    assert len(plan) == 10 and locations[-1] == (3, 1)
+
+
+def test_bidirectional_subsearch_leaves_detours_to_the_search_in_time(monkeypatch):
+    # the box is left out of the reduced state, the search in time walks through it in 4 moves
+    assert bidirectional_subsearch(get_navigation_state(BLOCKED)) is None
+    plan, _ = search_in_time(get_navigation_state(BLOCKED), monkeypatch)
+    assert len(plan) == 4
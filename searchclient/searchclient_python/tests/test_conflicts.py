@@ -0,0 +1,32 @@
+from action import Action
+from conflicts import find_conflicts
+from helpers import make_level
+
+INITIAL = [
+    '+++++++',
+    '+0A   +',
+    '+1+++++',
+    '+++++++',
+]
+GOAL = [
+    '+++++++',
+    '+   A +',
+    '+1+++++',
+    '+++++++',
+]
+
+
+def test_agent_following_a_pushing_agent_is_a_conflict():
+    level = make_level(['blue: 0, A', 'red: 1'], INITIAL, GOAL).level
+    plans = {'0': [[Action.PushEE]], '1': [[Action.MoveN]]}
+    locations = {'0': [(1, 2)], '1': [(1, 1)]}
+    conflicts = find_conflicts(plans, locations, level)
+    assert conflicts['1']['0'][0]['type'] == 'first_agent_through_second_agent_prev'
+    assert conflicts['0']['1'][0]['type'] == 'second_agent_through_first_agent_prev'
+
+
+def test_agent_entering_a_cell_left_a_step_earlier_is_no_conflict():
+    level = make_level(['blue: 0, A', 'red: 1'], INITIAL, GOAL).level
+    plans = {'0': [[Action.PushEE], [Action.PushEE]], '1': [[Action.NoOp], [Action.MoveN]]}
+    locations = {'0': [(1, 2), (1, 3)], '1': [(2, 1), (1, 1)]}
+    assert find_conflicts(plans, locations, level) == {}
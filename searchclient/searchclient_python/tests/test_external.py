@@ -0,0 +1,66 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import external
+from algorithms import subsearch
+from config import Config
+from frontier import FrontierBestFirst
+from heuristic import HeuristicAStar
+from helpers import load_level, make_level
+
+DETOUR = (
+    ['blue: 0, A'],
+    [
+        '+++++++',
+        '+0    +',
+        '+ +++ +',
+        '+ A   +',
+        '+++++++',
+    ],
+    [
+        '+++++++',
+        '+     +',
+        '+ +++ +',
+        '+    A+',
+        '+++++++',
+    ],
+)
+
+
+def get_state(level) -> 'State':
+    return make_level(*level) if isinstance(level, tuple) else load_level(level)
+
+
+def replay(state, plan, locations):
+    # the plan must be applicable, reach the goals and move the agent through locations
+    for joint_action, location in zip(plan, locations):
+        assert state.is_applicable(0, joint_action[0])
+        state = state.result(joint_action)
+        assert state.get_agent_location('0') == location
+    return state.is_goal_state()
+
+
+@pytest.mark.parametrize('level', [DETOUR, 'SAsoko1_08.lvl'])
+def test_external_search_finds_a_shortest_plan(level, tmp_path):
+    config = Config(external_dir=str(tmp_path))
+    state = get_state(level)
+    plan, locations = external.external_subsearch(state, HeuristicAStar(state), config)
+    assert replay(get_state(level), plan, locations)
+    state = get_state(level)
+    optimal, _ = subsearch(state, FrontierBestFirst(HeuristicAStar(state)), Config())
+    assert len(plan) == len(optimal)
+    assert list(tmp_path.iterdir()) == [] # the bucket files are removed
+
+
+def test_external_search_merges_runs_in_chunks(tmp_path, monkeypatch):
+    # buckets are written in many small runs and merged a few records at a time
+    monkeypatch.setattr(external, 'chunk_size', 2)
+    monkeypatch.setattr(external, 'buffer_size', 3)
+    config = Config(external_dir=str(tmp_path))
+    state = make_level(*DETOUR)
+    plan, locations = external.external_subsearch(state, HeuristicAStar(state), config)
+    assert replay(make_level(*DETOUR), plan, locations)
+    state = make_level(*DETOUR)
+    optimal, _ = subsearch(state, FrontierBestFirst(HeuristicAStar(state)), Config())
+    assert len(plan) == len(optimal)
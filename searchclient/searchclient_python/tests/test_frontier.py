@@ -0,0 +1,91 @@
+from math import inf
+
+from frontier import FrontierBucket, FrontierMultiQueue
+
+
+class TableHeuristic:
+    ''' Heuristic reading g and h of each state from a table, states are plain strings. '''
+    def __init__(self, values: 'dict', preferred: 'set' = frozenset()):
+        self.values = values
+        self.preferred = preferred
+
+    def h(self, state):
+        return self.values[state][1]
+
+    def f(self, state):
+        g, h = self.values[state]
+        return g + h
+
+    def is_preferred(self, state):
+        return state in self.preferred
+
+
+def pop_all(frontier) -> 'list':
+    states = []
+    while not frontier.is_empty():
+        states.append(frontier.pop())
+    return states
+
+
+def test_bucket_pops_lowest_f_then_lowest_h():
+    heuristic = TableHeuristic({'a': (2, 1), 'b': (1, 2), 'c': (0, 2), 'd': (3, 0), 'e': (0, inf)})
+    frontier = FrontierBucket(heuristic)
+    for state in 'abcde':
+        frontier.add(state)
+    assert frontier.size() == 5
+    assert pop_all(frontier) == ['c', 'd', 'a', 'b', 'e']
+
+
+def test_bucket_order_within_a_bucket():
+    heuristic = TableHeuristic({'x': (1, 1), 'y': (1, 1), 'z': (1, 1)})
+    lifo = FrontierBucket(heuristic)
+    fifo = FrontierBucket(heuristic, lifo=False)
+    for state in 'xyz':
+        lifo.add(state)
+        fifo.add(state)
+    assert pop_all(lifo) == ['z', 'y', 'x']
+    assert pop_all(fifo) == ['x', 'y', 'z']
+
+
+def test_bucket_adding_a_state_again_replaces_it():
+    heuristic = TableHeuristic({'a': (4, 1), 'b': (2, 1)})
+    frontier = FrontierBucket(heuristic)
+    frontier.add('a')
+    frontier.add('b')
+    heuristic.values['a'] = (0, 1) # reached again by a cheaper path
+    frontier.add('a')
+    assert frontier.size() == 2
+    assert pop_all(frontier) == ['a', 'b']
+    frontier.add('b')
+    assert frontier.pop() == 'b'
+
+
+def test_multi_queue_alternates_between_heuristics():
+    first = TableHeuristic({'a': (0, 0), 'b': (0, 1), 'c': (0, 2)})
+    second = TableHeuristic({'a': (0, 2), 'b': (0, 1), 'c': (0, 0)})
+    frontier = FrontierMultiQueue([first, second], preferred_boost=None)
+    for state in 'abc':
+        frontier.add(state)
+    assert pop_all(frontier) == ['a', 'c', 'b']
+
+
+def test_multi_queue_boosts_the_queue_that_made_progress():
+    first = TableHeuristic({'a': (0, 0), 'b': (0, 1), 'c': (0, 2), 'd': (0, 3), 'e': (0, 4), 'f': (0, 5)})
+    second = TableHeuristic({'a': (0, 4), 'b': (0, 3), 'c': (2, 0), 'd': (0, 1), 'e': (0, 2), 'f': (0, 2)})
+    frontier = FrontierMultiQueue([first, second], boosts=[0, 2], preferred_boost=None)
+    for state in 'abcdef':
+        frontier.add(state)
+    # the second queue lowers its own h with d and again with c, although neither lowers the
+    # first heuristic's h, so it is popped twice more after c and f comes before b
+    assert pop_all(frontier) == ['a', 'd', 'c', 'e', 'f', 'b']
+
+
+def test_multi_queue_pops_preferred_states_after_progress():
+    heuristic = TableHeuristic({'a': (0, 2), 'b': (0, 1), 'c': (0, 0)}, preferred={'a'})
+    plain = FrontierMultiQueue([heuristic], preferred_boost=None)
+    preferred = FrontierMultiQueue([heuristic], preferred_boost=5)
+    for state in 'abc':
+        plain.add(state)
+        preferred.add(state)
+    assert pop_all(plain) == ['c', 'b', 'a']
+    assert pop_all(preferred) == ['c', 'a', 'b']
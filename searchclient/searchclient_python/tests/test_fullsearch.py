@@ -0,0 +1,35 @@
+from algorithms import fullsearch
+from config import Config
+from frontier import FrontierBFS, FrontierBucket
+from heuristic import HeuristicAStar
+from helpers import is_solution, load_level, make_level
+
+SWAP = (
+    ['red: 0', 'blue: 1'],
+    [
+        '+++++++',
+        '+0   1+',
+        '+++ +++',
+        '+++++++',
+    ],
+    [
+        '+++++++',
+        '+1   0+',
+        '+++ +++',
+        '+++++++',
+    ],
+)
+
+
+def test_operator_decomposition_finds_a_shortest_plan():
+    state = make_level(*SWAP)
+    optimal = fullsearch(make_level(*SWAP), FrontierBFS(), Config())
+    plan = fullsearch(state, FrontierBucket(HeuristicAStar(state)), Config())
+    assert is_solution(make_level(*SWAP), plan)
+    assert len(plan) == len(optimal)
+
+
+def test_operator_decomposition_on_a_multi_agent_level():
+    state = load_level('MAPF02.lvl')
+    plan = fullsearch(state, FrontierBucket(HeuristicAStar(state)), Config())
+    assert is_solution(load_level('MAPF02.lvl'), plan)
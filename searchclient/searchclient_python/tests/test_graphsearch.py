@@ -0,0 +1,35 @@
+import pytest
+
+from config import Config
+from frontier import FrontierBestFirst
+from graphsearch import search
+from heuristic import HeuristicAStar
+from helpers import is_solution, load_level
+
+# multi-agent levels of runner.py whose merged plans were valid before the true-distance heuristic
+SOLVED_LEVELS = [
+    'TCBS0.lvl', 'TCBS0B.lvl', 'TCBS0C.lvl', 'TCBS1.lvl', 'TCBS1B.lvl', 'TCBS2.lvl', 'TCBS2B.lvl',
+    'TCBS3.lvl', 'TCBS3B.lvl', 'TCBS4.lvl', 'TAmjed.lvl', 'TAmjedB.lvl', 'TAmjedC.lvl', 'TMAExample.lvl',
+    'TMAsimple3.lvl', 'TMAsimple6.lvl', 'TMAsimple8.lvl', 'TMAsimple9.lvl', 'TMAsimple9B.lvl',
+    'TMAsimple10_no_deadlocks.lvl', 'TMAsimple10B_no_deadlocks.lvl', 'TMAsimple11_no_deadlocks.lvl',
+    'PIAForiginal.lvl', 'PIAF2.lvl', 'MAsimple1.lvl', 'MAsimple2.lvl', 'MAsimple3.lvl', 'MAExample.lvl',
+    'MAPF00.lvl', 'MAPF01.lvl', 'MAPF02.lvl', 'MAPF02B.lvl', 'MAPF03.lvl', 'MAPF03B.lvl', 'RoboMatic.lvl',
+    'competition/PIAF.lvl', 'competition/OnlyLast.lvl', 'competition/JarvisExe.lvl', 'competition/Spds.lvl',
+    'competition/Raffaello.lvl',
+]
+
+
+@pytest.mark.parametrize('name', SOLVED_LEVELS)
+def test_merged_plan_solves_the_level(name):
+    state = load_level(name, Config())
+    plan = search(state, FrontierBestFirst(HeuristicAStar(state)), Config())
+    assert is_solution(load_level(name, Config()), plan)
+
+
+
+# merged plan lengths of the Manhattan-distance heuristic, which the true distances keep
+@pytest.mark.parametrize('name, length', [('TMAsimple10_no_deadlocks.lvl', 8), ('competition/Spds.lvl', 16)])
+def test_merged_plan_length(name, length):
+    state = load_level(name, Config())
+    plan = search(state, FrontierBestFirst(HeuristicAStar(state)), Config())
+    assert len(plan) == length
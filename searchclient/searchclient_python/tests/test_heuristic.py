@@ -0,0 +1,63 @@
+import itertools
+import random
+from math import inf
+
+import pytest
+
+from algorithms import fullsearch
+from config import Config
+from frontier import FrontierBFS
+from heuristic import HeuristicAStar, min_cost_assignment
+from helpers import load_level, make_level
+
+
+def brute_force_assignment(costs):
+    rows, columns = len(costs), len(costs[0])
+    if rows <= columns:
+        return min(sum(costs[row][column] for row, column in enumerate(permutation)) for permutation in itertools.permutations(range(columns), rows))
+    return min(sum(costs[row][column] for column, row in enumerate(permutation)) for permutation in itertools.permutations(range(rows), columns))
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_min_cost_assignment_matches_brute_force(seed):
+    rng = random.Random(seed)
+    rows, columns = rng.randint(1, 5), rng.randint(1, 5)
+    costs = [[inf if rng.random() < 0.15 else rng.randint(0, 20) for _ in range(columns)] for _ in range(rows)]
+    assert min_cost_assignment(costs) == brute_force_assignment(costs)
+
+
+def test_min_cost_assignment_of_nothing_is_zero():
+    assert min_cost_assignment([]) == 0
+    assert min_cost_assignment([[]]) == 0
+
+
+TWO_AGENTS = (
+    ['red: 0, A', 'blue: 1, B'],
+    [
+        '+++++++',
+        '+0A   +',
+        '+ +++ +',
+        '+1B   +',
+        '+++++++',
+    ],
+    [
+        '+++++++',
+        '+    A+',
+        '+ +++ +',
+        '+B    +',
+        '+++++++',
+    ],
+)
+
+
+@pytest.mark.parametrize('state', [
+    lambda: load_level('MAPF00.lvl'),
+    lambda: load_level('SAsoko1_08.lvl'),
+    lambda: load_level('SAsimple1.lvl'),
+    lambda: make_level(*TWO_AGENTS),
+])
+def test_h_of_the_initial_state_is_at_most_the_optimal_plan_length(state):
+    state = state()
+    plan = fullsearch(state, FrontierBFS(), Config())
+    assert plan is not None
+    assert HeuristicAStar(state).h(state) <= len(plan)
@@ -0,0 +1,65 @@
+from action import Action, ActionType
+from helpers import make_level
+
+# the room on the right is walled off from the goal of A
+TWO_ROOMS = (
+    ['blue: 0, A'],
+    [
+        '+++++++++',
+        '+0A + A +',
+        '+   +   +',
+        '+++++++++',
+    ],
+    [
+        '+++++++++',
+        '+  A+   +',
+        '+  A+   +',
+        '+++++++++',
+    ],
+)
+
+
+def test_cells_walled_off_from_the_goals_are_dead():
+    level = make_level(*TWO_ROOMS).level
+    assert level.dead_cells == {'A': frozenset((row, col) for row in (1, 2) for col in (5, 6, 7))}
+
+
+def test_corners_and_walls_are_not_dead_with_pulls():
+    initial = [
+        '+++++++',
+        '+0 A  +',
+        '+     +',
+        '+++++++',
+    ]
+    goal = [
+        '+++++++',
+        '+     +',
+        '+    A+',
+        '+++++++',
+    ]
+    assert make_level(['blue: 0, A'], initial, goal).level.dead_cells == {}
+
+
+def test_box_types_with_spare_boxes_have_no_dead_cells():
+    goal = [
+        '+++++++++',
+        '+  A+   +',
+        '+   +   +',
+        '+++++++++',
+    ]
+    assert make_level(TWO_ROOMS[0], TWO_ROOMS[1], goal).level.dead_cells == {}
+
+
+def test_boxes_are_not_moved_into_dead_cells():
+    # agent 1 shares the walled off room with a box of A
+    initial = [
+        '+++++++++',
+        '+0A +A1 +',
+        '+   +   +',
+        '+++++++++',
+    ]
+    state = make_level(['blue: 0, 1, A'], initial, TWO_ROOMS[2])
+    for action in (Action.PullEE, Action.PushWS, Action.PushWN):
+        assert not state.is_applicable(1, action)
+    assert all(action.type in (ActionType.NoOp, ActionType.Move) for action in state.get_applicable_actions(1))
+    assert Action.PullSW in state.get_applicable_actions(0)
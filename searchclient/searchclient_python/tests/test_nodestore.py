@@ -0,0 +1,55 @@
+from action import Action
+from nodestore import NodeStore
+from helpers import make_level
+
+INITIAL = [
+    '+++++++',
+    '+0    +',
+    '+++++++',
+]
+GOAL = [
+    '+++++++',
+    '+    0+',
+    '+++++++',
+]
+
+
+def test_extract_plan_walks_the_parent_indices():
+    root = make_level(['blue: 0'], INITIAL, GOAL)
+    nodes = NodeStore(root)
+    state = root
+    nodes.add(state)
+    for _ in range(4):
+        child = state.result([Action.MoveE])
+        nodes.add(child)
+        state = child
+    assert nodes.size() == 5
+    assert nodes.extract_plan(state.node) == [[Action.MoveE]] * 4
+    assert state.extract_plan() == [[Action.MoveE]] * 4
+
+
+def test_extract_plan_with_locations_replays_agent_0():
+    root = make_level(['blue: 0'], INITIAL, GOAL)
+    nodes = NodeStore(root)
+    nodes.add(root)
+    child = root.result([Action.MoveE])
+    nodes.add(child)
+    grandchild = child.result([Action.MoveE])
+    nodes.add(grandchild)
+    # recorded states drop their parents, the plan comes from the store
+    assert child.parent is None and grandchild.parent is None
+    plan, locations = grandchild.extract_plan_with_locations()
+    assert plan == [[Action.MoveE], [Action.MoveE]]
+    assert locations == [(1, 2), (1, 3)]
+
+
+def test_macro_steps_share_one_action_id():
+    root = make_level(['blue: 0'], INITIAL, GOAL)
+    nodes = NodeStore(root)
+    nodes.add(root)
+    child = root.result([Action.MoveE]).result([Action.MoveE])
+    child.parent = root
+    child.macro = [[Action.MoveE], [Action.MoveE]]
+    nodes.add(child)
+    assert nodes.extract_plan(child.node) == [[Action.MoveE], [Action.MoveE]]
+    assert len(nodes.joint_actions) == 1
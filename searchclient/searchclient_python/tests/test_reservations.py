@@ -0,0 +1,44 @@
+from reservations import ReservationTable
+
+
+def test_open_ended_reservation_blocks_from_its_start():
+    table = ReservationTable()
+    table.reserve((1, 1), 5)
+    assert table.is_free((1, 1), 4)
+    assert not table.is_free((1, 1), 5)
+    assert not table.is_free((1, 1), 1000)
+    assert table.is_free((1, 2), 5)
+
+
+def test_open_ended_reservation_keeps_the_earliest_start():
+    table = ReservationTable()
+    table.reserve((1, 1), 5)
+    table.reserve((1, 1), 3)
+    table.reserve((1, 1), 8)
+    assert table.is_free((1, 1), 2)
+    assert not table.is_free((1, 1), 3)
+
+
+def test_interval_reservation_ends_before_end():
+    table = ReservationTable()
+    table.reserve((2, 3), 2, 4)
+    assert [table.is_free((2, 3), t) for t in range(6)] == [True, True, False, False, True, True]
+
+
+def test_reserve_path_blocks_two_steps_before_each_cell():
+    table = ReservationTable()
+    table.reserve_path([(1, 1), (1, 2)], 0)
+    # (1, 1) is held at step 1 and (1, 2) at step 2
+    assert [table.is_free((1, 1), t) for t in range(4)] == [False, False, True, True]
+    assert [table.is_free((1, 2), t) for t in range(4)] == [False, False, False, True]
+
+
+def test_clear_paths_keeps_goal_cells():
+    table = ReservationTable()
+    table.reserve((1, 1), 0)
+    table.reserve_path([(1, 2), (1, 3)], 0)
+    table.clear_paths()
+    assert not table.is_free((1, 1), 0)
+    assert table.is_free((1, 2), 0)
+    assert table.is_free((1, 3), 1)
+    assert len(table) == 1
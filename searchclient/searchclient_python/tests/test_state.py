@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from action import Action, ActionType
+from helpers import load_level, make_level
+from state import State, StateHandle
+
+# Sokoban freeze pattern: box A is pushed into the corner of walls north and west of it
+CORNER = (
+    ['blue: 0, A'],
+    [
+        '++++++',
+        '+  A0+',
+        '+    +',
+        '++++++',
+    ],
+    [
+        '++++++',
+        '+    +',
+        '+   A+',
+        '++++++',
+    ],
+)
+
+
+def get_reverse(action: 'Action') -> 'Action':
+    # a push is undone by pulling the box back the way it came, a pull by pushing it back
+    reverse_type = ActionType.Pull if action.type is ActionType.Push else ActionType.Push
+    for reverse in Action:
+        if reverse.type is reverse_type and (reverse.agent_row_delta, reverse.agent_col_delta, reverse.box_row_delta, reverse.box_col_delta) == (-action.agent_row_delta, -action.agent_col_delta, -action.box_row_delta, -action.box_col_delta):
+            return reverse
+
+
+def test_box_pushed_into_a_corner_can_still_be_moved():
+    state = make_level(*CORNER)
+    state = state.result([Action.PushWW]).result([Action.PushWW])
+    assert (state.boxes_map[0].row, state.boxes_map[0].col) == (1, 1)
+    # frozen in Sokoban, but from below the agent pushes it east or pulls it south here
+    state = state.result([Action.MoveS]).result([Action.MoveW])
+    applicable_actions = state.get_applicable_actions(0)
+    assert Action.PushNN not in applicable_actions
+    assert Action.PushNE in applicable_actions and Action.PullES in applicable_actions
+    assert state.result([Action.PushNE]).get_box_location(0) == (1, 2)
+    assert state.result([Action.PullES]).get_box_location(0) == (2, 1)
+
+
+@pytest.mark.parametrize('moves', [[], [Action.MoveS], [Action.MoveS, Action.MoveW]])
+def test_every_push_and_pull_can_be_undone(moves):
+    # so no single move leaves the box it moved frozen, see State.get_expanded_states
+    state = make_level(*CORNER)
+    for move in moves:
+        state = state.result([move])
+    for child in state.get_expanded_states():
+        action = child.joint_action[0]
+        if action.type not in (ActionType.Push, ActionType.Pull):
+            continue
+        reverse = get_reverse(action)
+        assert child.is_applicable(0, reverse)
+        assert child.result([reverse]) == state
+
+
+
+def get_fresh_hash(state: 'State') -> 'int':
+    # hash of the same positions computed from scratch instead of updated from the parent
+    return State(state.level, state.boxes, state.agents_map, state.boxes_map).__hash__()
+
+
+def test_incremental_hash_matches_the_hash_from_scratch():
+    rng = random.Random(0)
+    state = load_level('MAsimple1.lvl')
+    for _ in range(200):
+        child = rng.choice(state.get_expanded_states())
+        assert child.__hash__() == get_fresh_hash(child)
+        assert StateHandle(state, child.joint_action).__hash__() == child.__hash__()
+        state = child
+
+
+def test_same_positions_reached_in_different_orders_hash_equal():
+    initial = make_level(*CORNER)
+    south_first = initial.result([Action.MoveS]).result([Action.MoveW])
+    west_first = initial.result([Action.PushWW]).result([Action.PullEE]).result([Action.MoveS]).result([Action.MoveW])
+    assert south_first.get_agent_location('0') == west_first.get_agent_location('0') == (2, 3)
+    assert south_first.__hash__() == west_first.__hash__()
+    assert south_first == west_first
+    assert south_first.__hash__() != initial.__hash__()
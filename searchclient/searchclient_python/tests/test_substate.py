@@ -0,0 +1,25 @@
+from helpers import make_level
+from substate import match_goal, update_state
+
+INITIAL = [
+    '+++++++',
+    '+0A   +',
+    '+++++++',
+]
+GOAL = [
+    '+++++++',
+    '+    A+',
+    '+++++++',
+]
+
+
+def test_solved_goal_cell_is_reserved_from_the_step_it_is_solved_at():
+    state = make_level(['blue: 0, A'], INITIAL, GOAL)
+    goal = next(iter(state.goals_map.values()))
+    match = match_goal(state, goal, {})
+    # the agent already has 6 actions planned when its 3 pushes for this goal end
+    state = update_state(state, match, [(1, 2), (1, 3), (1, 4)], 9)
+    assert state.reservations.is_free((1, 5), 8)
+    assert not state.reservations.is_free((1, 5), 9)
+    assert state.get_agent_location('0') == (1, 4)
+    assert state.num_boxes == 0